@@ -0,0 +1,220 @@
+# MIT License
+#
+# Copyright (c) 2023 Kovács József Miklós
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import math
+
+from dataclasses import dataclass
+
+from cookie import Cookie
+from factory import Factory
+from effect import ObtainableEffect
+from catalog import CATALOG
+from player import Player
+
+
+@dataclass(frozen=True)
+class Achievement:
+    """Earned once the player has at least the threshold of a cookie or a factory"""
+
+    name: str
+    description: str
+    key: Cookie | Factory
+    threshold: int
+    reward: ObtainableEffect | None = None
+
+    def __str__(self) -> str:
+        return self.description or self.name.replace("_", " ").capitalize()
+
+
+def _achievements() -> tuple[Achievement, ...]:
+    kinds = (tuple(Cookie), tuple(Factory))
+    rewards = tuple(ObtainableEffect)
+    return tuple(
+        Achievement(
+            name,
+            description,
+            kinds[kind][ordinal],
+            threshold,
+            rewards[reward] if reward >= 0 else None,
+        )
+        for name, description, (kind, ordinal, threshold), reward in zip(
+            CATALOG.achievements,
+            CATALOG.achievement_descriptions,
+            CATALOG.achievement_goals,
+            CATALOG.achievement_rewards,
+        )
+    )
+
+
+ACHIEVEMENTS: tuple[Achievement, ...] = _achievements()
+
+# The achievements of every cookie and factory sorted by their threshold,
+# indexed by the ordinal of the cookie or factory
+BY_COOKIE: tuple[tuple[Achievement, ...], ...] = tuple(
+    tuple(sorted((a for a in ACHIEVEMENTS if a.key is c), key=lambda a: a.threshold))
+    for c in Cookie
+)
+BY_FACTORY: tuple[tuple[Achievement, ...], ...] = tuple(
+    tuple(sorted((a for a in ACHIEVEMENTS if a.key is f), key=lambda a: a.threshold))
+    for f in Factory
+)
+
+
+class Progress:
+    """The achievements of a player, and the next unmet threshold of every cookie and factory
+
+    A check compares every count with the next threshold of its key, so it
+    costs the same however many achievements are still pending, and only the
+    keys that have achievements at all are looked at.
+    """
+
+    __slots__ = ("earned", "new", "_positions", "_next", "_rewards")
+
+    def __init__(self) -> None:
+        self.earned: list[Achievement] = []
+        # Earned but not yet announced, see take_new
+        self.new: list[Achievement] = []
+        # The position of the next unmet achievement in BY_COOKIE and BY_FACTORY
+        self._positions = ([0] * len(BY_COOKIE), [0] * len(BY_FACTORY))
+        # The threshold of the next unmet achievement of the keys that have one
+        self._next: tuple[dict[int, float], dict[int, float]] = (
+            {o: pending[0].threshold for o, pending in enumerate(BY_COOKIE) if pending},
+            {
+                o: pending[0].threshold
+                for o, pending in enumerate(BY_FACTORY)
+                if pending
+            },
+        )
+        # The next unmet achievement with a reward of the cookies that have one
+        self._rewards: dict[int, Achievement] = {}
+        for ordinal in range(len(BY_COOKIE)):
+            self._next_reward(ordinal)
+
+    def _next_reward(self, ordinal: int) -> None:
+        pending = BY_COOKIE[ordinal][self._positions[0][ordinal] :]
+        rewarded = [achievement for achievement in pending if achievement.reward]
+        if rewarded:
+            self._rewards[ordinal] = rewarded[0]
+        else:
+            self._rewards.pop(ordinal, None)
+
+    def horizon(self, player: Player) -> float:
+        """Returns how many seconds the player can produce at once without earning a reward
+
+        A cookie grows by at most its rate plus every bonus of the factories in
+        a second, so no reward can be earned before its threshold is in reach.
+
+        Returns:
+            At least one second, or infinity if no reward is pending
+        """
+
+        seconds = math.inf
+        gains = None
+        cookies = player.cookies.counts
+        for ordinal, achievement in self._rewards.items():
+            if achievement.reward.function in player.effects:
+                continue
+            if gains is None:
+                gains = list(player.rate.counts)
+                bonus = player.production.max_bonus(player.factories)
+                for cookie, amount in bonus.items():
+                    gains[cookie.ordinal] += amount
+            gain = gains[ordinal]
+            if gain > 0:
+                gap = achievement.threshold - cookies[ordinal]
+                seconds = min(seconds, max(-(-gap // gain), 1))
+        return seconds
+
+    def check(self, player: Player) -> None:
+        """Earn every achievement the player has reached, giving their rewards"""
+
+        cookies = player.cookies.counts
+        for ordinal, threshold in self._next[0].items():
+            if cookies[ordinal] >= threshold:
+                self._earn(player, 0, ordinal, BY_COOKIE[ordinal])
+
+        factories = player.factories.counts
+        for ordinal, threshold in self._next[1].items():
+            if factories[ordinal] >= threshold:
+                self._earn(player, 1, ordinal, BY_FACTORY[ordinal])
+
+    def _earn(
+        self,
+        player: Player,
+        kind: int,
+        ordinal: int,
+        pending: tuple[Achievement, ...],
+    ) -> None:
+        count = (player.cookies.counts, player.factories.counts)[kind][ordinal]
+        positions = self._positions[kind]
+
+        earned = []
+        while positions[ordinal] < len(pending):
+            achievement = pending[positions[ordinal]]
+            if count < achievement.threshold:
+                break
+            earned.append(achievement)
+            positions[ordinal] += 1
+
+        self._next[kind][ordinal] = (
+            pending[positions[ordinal]].threshold
+            if positions[ordinal] < len(pending)
+            else math.inf
+        )
+        if kind == 0:
+            self._next_reward(ordinal)
+        self.earned += earned
+        self.new += earned
+
+        # The rewards come after the bookkeeping, because a new effect checks again
+        for achievement in earned:
+            reward = achievement.reward
+            if reward is not None and reward.function not in player.effects:
+                player.add_effect(reward.function)
+
+    def take_new(self) -> list[Achievement]:
+        """Returns the achievements earned since the last call"""
+
+        new, self.new = self.new, []
+        return new
+
+
+def track(player: Player, announce: bool = False) -> Progress:
+    """Start tracking the achievements of the player
+
+    The thresholds the player already reached are earned at once, their
+    rewards are only given if the player does not have them yet.
+
+    Args:
+        player: The player to be tracked
+        announce: Whether the achievements earned at once are new, see Progress.take_new
+
+    Returns:
+        The progress of the player, which it keeps up to date from now on
+    """
+
+    progress = Progress()
+    progress.check(player)
+    if not announce:
+        progress.take_new()
+    player.achievements = progress
+    return progress
@@ -0,0 +1,240 @@
+# MIT License
+#
+# Copyright (c) 2023 Kovács József Miklós
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import sys
+import json
+import time
+import argparse
+
+from typing import Callable, Iterator
+
+from cookie import Cookie
+from factory import Factory, FactoryInfo
+from effect import EFFECTS, effect_composition, compile_effects
+from player import Player, NotEnoughCookie
+
+# The name, a function building what is measured, and the calls per timing
+Case = tuple[str, Callable[[], Callable[[], object]], int]
+
+# The factories are chosen by their traits, as the catalog can change
+PRICED = sorted(Factory, key=lambda factory: factory.base_price)[len(Factory) // 2]
+PRODUCING = max(Factory, key=lambda factory: len(factory.production_volume))
+
+
+def _player(factories: int, effects: int, seed: int = 0) -> Player:
+    """A player owning 10 of the first factories and having the first effects"""
+
+    player = Player(seed=seed)
+    for factory in list(Factory)[:factories]:
+        player.factories[factory] = 10
+    for effect in EFFECTS[:effects]:
+        player.effects.add(effect)
+    player.refresh()
+    return player
+
+
+def tick_cases() -> Iterator[Case]:
+    for factories in range(1, len(Factory) + 1):
+        for effects in range(len(EFFECTS) + 1):
+
+            def tick(
+                factories: int = factories, effects: int = effects
+            ) -> Callable[[], object]:
+                return _player(factories, effects).tick
+
+            yield f"tick/factories={factories}/effects={effects}", tick, 10000
+
+
+def pricing_cases() -> Iterator[Case]:
+    for quantity in (1, 10, 100, 1000, 10000):
+
+        def buy_and_sell(quantity: int = quantity) -> Callable[[], object]:
+            def run() -> None:
+                player = Player()
+                player.cookies[Cookie.COOKIE] = Player.get_factories_price(
+                    0, quantity, PRICED.base_price
+                )
+                player.buy_factory(PRICED, quantity)
+                player.sell_factory(PRICED, quantity)
+
+            run()  # The shared price table is grown only once
+            return run
+
+        yield f"buy_sell/quantity={quantity}", buy_and_sell, 1000
+
+    # Orders beyond the cookies are rejected without pricing them exactly
+    for quantity in (100000, 1000000):
+
+        def rejected(quantity: int = quantity) -> Callable[[], object]:
+            player = Player()
+            player.cookies[Cookie.COOKIE] = 10**6
+
+            def run() -> None:
+                try:
+                    player.buy_factory(PRICED, quantity)
+                except NotEnoughCookie:
+                    pass
+
+            return run
+
+        yield f"buy_rejected/quantity={quantity}", rejected, 1000
+
+
+def effect_cases() -> Iterator[Case]:
+    info = FactoryInfo(PRODUCING, PRODUCING.production_volume)
+    for effects in range(len(EFFECTS) + 1):
+
+        def composition(effects: int = effects) -> Callable[[], object]:
+            composed = effect_composition(*EFFECTS[:effects])
+            return lambda: composed(info)
+
+        def compiled(effects: int = effects) -> Callable[[], object]:
+            table = compile_effects(frozenset(EFFECTS[:effects]))
+            return lambda: table.produce(PRODUCING, 10)
+
+        yield f"effect_composition/effects={effects}", composition, 10000
+        yield f"compiled_effects/effects={effects}", compiled, 10000
+
+
+def _players(size: int) -> list[Player]:
+    return [_player(len(Factory), len(EFFECTS), seed) for seed in range(size)]
+
+
+def population_cases() -> Iterator[Case]:
+    try:
+        from population import Population
+    except ImportError:
+        Population = None  # The vectorized engine needs NumPy
+
+    for size in (1, 100, 10000, 100000):
+
+        def tick_players(size: int = size) -> Callable[[], object]:
+            players = _players(size)
+
+            def run() -> None:
+                for player in players:
+                    player.tick()
+
+            return run
+
+        yield f"players_tick/size={size}", tick_players, max(1, 10000 // size)
+
+        if Population is not None:
+
+            def tick_population(size: int = size) -> Callable[[], object]:
+                return Population.from_players(_players(size)).tick
+
+            yield (
+                f"population_tick/size={size}",
+                tick_population,
+                max(1, 100000 // size),
+            )
+
+
+SUITES = {
+    "tick": tick_cases,
+    "pricing": pricing_cases,
+    "effects": effect_cases,
+    "population": population_cases,
+}
+
+
+def measure(function: Callable[[], object], number: int, repeat: int = 5) -> float:
+    """Returns the best of the repeated timings of one call, in seconds"""
+
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def run(suites: list[str], pattern: str = "", scale: float = 1.0) -> dict[str, float]:
+    results = {}
+    for suite in suites:
+        for name, build, number in SUITES[suite]():
+            if pattern in name:
+                results[name] = measure(build(), max(1, int(number * scale)))
+                print(f"{name:48} {results[name] * 1e6:14.2f} µs", flush=True)
+    return results
+
+
+def compare(
+    results: dict[str, float], baseline: dict[str, float], threshold: float
+) -> list[str]:
+    """Returns the cases that are slower than the baseline by more than the threshold"""
+
+    regressions = []
+    for name, seconds in results.items():
+        if name in baseline and seconds > baseline[name] * (1 + threshold):
+            ratio = seconds / baseline[name]
+            regressions.append(f"{name}: {ratio:.2f}x slower than the baseline")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Cookie-factory benchmarks")
+    parser.add_argument(
+        "suites", nargs="*", metavar="suite", help=f"one of {', '.join(SUITES)}"
+    )
+    parser.add_argument("-k", dest="pattern", default="", help="only matching cases")
+    parser.add_argument("--baseline", help="compare with the JSON baseline file")
+    parser.add_argument("--save", help="write the results as a JSON baseline file")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="allowed slowdown compared to the baseline (default: 0.25)",
+    )
+    parser.add_argument(
+        "--scale",
+        type=float,
+        default=1.0,
+        help="multiply the number of calls per timing, e.g. 0.1 for a quick run",
+    )
+    args = parser.parse_args()
+    for suite in args.suites:
+        if suite not in SUITES:
+            parser.error(f"unknown suite: {suite}")
+
+    results = run(args.suites or list(SUITES), args.pattern, args.scale)
+
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+            file.write("\n")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        for regression in regressions:
+            print(regression, file=sys.stderr)
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
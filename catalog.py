@@ -0,0 +1,327 @@
+# MIT License
+#
+# Copyright (c) 2023 Kovács József Miklós
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import os
+import sys
+import json
+import marshal
+
+from dataclasses import dataclass, fields
+from typing import Any
+
+# The catalog the game is started with, unless the environment names another one
+PATH = os.environ.get(
+    "COOKIE_FACTORY_CATALOG", os.path.join(os.path.dirname(__file__), "catalog.json")
+)
+
+# Changed whenever the compiled form changes, so older caches are not loaded
+_FORMAT = 3
+
+# ("multiply", factor, cookie, factory or -1) or ("bonus", amount, success, failure)
+Rule = tuple[str, int, int, int]
+
+
+class CatalogError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class Catalog:
+    """The content of the game compiled into tables indexed by ordinals
+
+    The cookies, factories and effects are referred to by their ordinal, which
+    is their position in the catalog file.
+    """
+
+    cookies: tuple[str, ...]
+    factories: tuple[str, ...]
+    factory_prices: tuple[int, ...]
+    factory_currencies: tuple[int, ...]
+    factory_volumes: tuple[tuple[tuple[int, int], ...], ...]
+    effects: tuple[str, ...]
+    effect_descriptions: tuple[str, ...]
+    effect_rules: tuple[tuple[Rule, ...], ...]
+    purchasable: tuple[int, ...]
+    purchasable_prices: tuple[int, ...]
+    purchasable_currencies: tuple[int, ...]
+    # The seconds a timed effect lasts for, or 0 for a permanent one
+    purchasable_durations: tuple[int, ...]
+    obtainable: tuple[int, ...]
+    obtainable_weights: tuple[int, ...]
+    obtainable_messages: tuple[str, ...]
+    obtainable_durations: tuple[int, ...]
+    no_drop_weight: int
+    achievements: tuple[str, ...]
+    achievement_descriptions: tuple[str, ...]
+    # (0 for a cookie or 1 for a factory, its ordinal, the threshold)
+    achievement_goals: tuple[tuple[int, int, int], ...]
+    # The ordinal of the obtainable effect given as a reward, or -1
+    achievement_rewards: tuple[int, ...]
+
+
+def _names(entries: Any, kind: str, objects: bool = True) -> dict[str, int]:
+    """Returns the ordinal of every name, which must be unique identifiers
+
+    Args:
+        entries: The list of the entries
+        kind: What the entries are, for the error messages
+        objects: Whether the entries are objects with a name, or the names themselves
+    """
+
+    if not isinstance(entries, list):
+        raise CatalogError(f"The {kind} entries must be a list")
+
+    ordinals: dict[str, int] = {}
+    for ordinal, entry in enumerate(entries):
+        if objects and not isinstance(entry, dict):
+            raise CatalogError(f"The {kind} entry {entry!r} must be an object")
+        name = entry.get("name") if objects else entry
+        if not isinstance(name, str) or not name.isidentifier() or not name.islower():
+            raise CatalogError(f"Invalid {kind} name: {name!r}")
+        if name in ordinals:
+            raise CatalogError(f"The {kind} {name!r} is listed twice")
+        ordinals[name] = ordinal
+    return ordinals
+
+
+def _lookup(ordinals: dict[str, int], name: Any, kind: str, owner: str) -> int:
+    try:
+        return ordinals[name]
+    except (KeyError, TypeError):
+        raise CatalogError(f"Unknown {kind} in {owner}: {name!r}") from None
+
+
+def _positive(value: Any, what: str, owner: str) -> int:
+    if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+        raise CatalogError(f"The {what} of {owner} must be a positive integer")
+    return value
+
+
+def compile_catalog(data: dict) -> Catalog:
+    """Validate the parsed catalog file and compile it into tables
+
+    Raises:
+        CatalogError: An error occurred if the catalog is not valid
+    """
+
+    if not isinstance(data, dict):
+        raise CatalogError("The catalog must be an object")
+
+    try:
+        cookie_entries = data["cookies"]
+        factory_entries = data["factories"]
+        effect_entries = data["effects"]
+    except (KeyError, TypeError) as error:
+        raise CatalogError(f"The catalog has no {error} list") from None
+
+    cookies = _names(cookie_entries, "cookie", objects=False)
+    if "cookie" not in cookies:
+        raise CatalogError("The catalog must have the hand-made 'cookie'")
+    factories = _names(factory_entries, "factory")
+    effects = _names(effect_entries, "effect")
+
+    prices, currencies, volumes = [], [], []
+    for entry in factory_entries:
+        owner = f"the factory {entry['name']!r}"
+        prices.append(_positive(entry.get("price"), "price", owner))
+        currency = entry.get("currency", "cookie")
+        currencies.append(_lookup(cookies, currency, "cookie", owner))
+        production = entry.get("production")
+        if not isinstance(production, dict) or not production:
+            raise CatalogError(f"The production of {owner} must not be empty")
+        volumes.append(
+            tuple(
+                (
+                    _lookup(cookies, cookie, "cookie", owner),
+                    _positive(amount, "production", owner),
+                )
+                for cookie, amount in production.items()
+            )
+        )
+
+    descriptions, rules = [], []
+    purchasable, purchasable_prices, purchasable_currencies = [], [], []
+    purchasable_durations, obtainable_durations = [], []
+    obtainable, weights, messages = [], [], []
+    for ordinal, entry in enumerate(effect_entries):
+        owner = f"the effect {entry['name']!r}"
+        descriptions.append(str(entry.get("description", "")))
+
+        compiled: list[Rule] = []
+        rule_entries = entry.get("rules", [])
+        if not isinstance(rule_entries, list):
+            raise CatalogError(f"The rules of {owner} must be a list")
+        for rule in rule_entries:
+            if not isinstance(rule, dict):
+                raise CatalogError(f"The rule {rule!r} of {owner} must be an object")
+            if "multiply" in rule:
+                factor = _positive(rule["multiply"], "factor", owner)
+                cookie = _lookup(cookies, rule.get("cookie"), "cookie", owner)
+                factory = rule.get("factory")
+                if factory is not None:
+                    factory = _lookup(factories, factory, "factory", owner)
+                compiled.append(
+                    ("multiply", factor, cookie, -1 if factory is None else factory)
+                )
+            elif "bonus" in rule:
+                amount = _positive(rule["bonus"], "bonus", owner)
+                match rule.get("weights"):
+                    case [int() as success, int() as failure] if (
+                        success >= 0 and failure >= 0 and success + failure > 0
+                    ):
+                        compiled.append(("bonus", amount, success, failure))
+                    case _:
+                        raise CatalogError(f"The weights of {owner} must be two counts")
+            else:
+                raise CatalogError(f"Unknown rule of {owner}: {rule!r}")
+        rules.append(tuple(compiled))
+
+        if "price" in entry:
+            purchasable.append(ordinal)
+            purchasable_prices.append(_positive(entry["price"], "price", owner))
+            currency = entry.get("currency", "cookie")
+            purchasable_currencies.append(_lookup(cookies, currency, "cookie", owner))
+            seconds = entry.get("seconds")
+            purchasable_durations.append(
+                0 if seconds is None else _positive(seconds, "seconds", owner)
+            )
+        if "drop" in entry:
+            if not isinstance(entry["drop"], dict):
+                raise CatalogError(f"The drop of {owner} must be an object")
+            obtainable.append(ordinal)
+            weights.append(_positive(entry["drop"].get("weight"), "drop weight", owner))
+            messages.append(str(entry["drop"].get("message", "")))
+            seconds = entry["drop"].get("seconds")
+            obtainable_durations.append(
+                0 if seconds is None else _positive(seconds, "drop seconds", owner)
+            )
+
+    no_drop_weight = data.get("no_drop_weight", 100)
+    if not isinstance(no_drop_weight, int) or no_drop_weight < 0:
+        raise CatalogError("The no_drop_weight must not be negative")
+    if no_drop_weight + sum(weights) == 0:
+        raise CatalogError(
+            "The no_drop_weight and the drop weights must not all be zero"
+        )
+
+    achievement_entries = data.get("achievements", [])
+    achievements = _names(achievement_entries, "achievement")
+    obtainable_names = {effect_entries[i]["name"]: n for n, i in enumerate(obtainable)}
+    goals, rewards, achievement_descriptions = [], [], []
+    for entry in achievement_entries:
+        owner = f"the achievement {entry['name']!r}"
+        achievement_descriptions.append(str(entry.get("description", "")))
+        threshold = _positive(entry.get("at_least"), "threshold", owner)
+        if "cookie" in entry:
+            goal = (0, _lookup(cookies, entry["cookie"], "cookie", owner), threshold)
+        elif "factory" in entry:
+            goal = (
+                1,
+                _lookup(factories, entry["factory"], "factory", owner),
+                threshold,
+            )
+        else:
+            raise CatalogError(f"The goal of {owner} must be a cookie or a factory")
+        goals.append(goal)
+        reward = entry.get("reward")
+        if reward is None:
+            rewards.append(-1)
+        else:
+            rewards.append(
+                _lookup(obtainable_names, reward, "obtainable effect", owner)
+            )
+
+    return Catalog(
+        cookies=tuple(cookies),
+        factories=tuple(factories),
+        factory_prices=tuple(prices),
+        factory_currencies=tuple(currencies),
+        factory_volumes=tuple(volumes),
+        effects=tuple(effects),
+        effect_descriptions=tuple(descriptions),
+        effect_rules=tuple(rules),
+        purchasable=tuple(purchasable),
+        purchasable_prices=tuple(purchasable_prices),
+        purchasable_currencies=tuple(purchasable_currencies),
+        purchasable_durations=tuple(purchasable_durations),
+        obtainable=tuple(obtainable),
+        obtainable_weights=tuple(weights),
+        obtainable_messages=tuple(messages),
+        obtainable_durations=tuple(obtainable_durations),
+        no_drop_weight=no_drop_weight,
+        achievements=tuple(achievements),
+        achievement_descriptions=tuple(achievement_descriptions),
+        achievement_goals=tuple(goals),
+        achievement_rewards=tuple(rewards),
+    )
+
+
+def _cache_path(path: str) -> str:
+    directory, name = os.path.split(os.path.abspath(path))
+    name = f"{os.path.splitext(name)[0]}.{sys.implementation.cache_tag}.marshal"
+    return os.path.join(directory, "__pycache__", name)
+
+
+def load(path: str = PATH) -> Catalog:
+    """Load the catalog, from its compiled form cached on disk when it is up to date
+
+    Like a .pyc file, the cache is valid as long as the modification time and
+    size of the catalog file did not change. It is written next to the compiled
+    modules, and silently skipped if that directory is not writable.
+
+    Raises:
+        CatalogError: An error occurred if the catalog is not valid
+    """
+
+    stat = os.stat(path)
+    stamp = (_FORMAT, stat.st_mtime_ns, stat.st_size)
+    cache = _cache_path(path)
+
+    try:
+        with open(cache, "rb") as file:
+            cached_stamp, tables = marshal.loads(file.read())
+        if cached_stamp == stamp:
+            return Catalog(*tables)
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+
+    with open(path, "rb") as file:
+        try:
+            data = json.load(file)
+        except json.JSONDecodeError as error:
+            raise CatalogError(f"The catalog is not valid JSON: {error}") from None
+    catalog = compile_catalog(data)
+
+    tables = tuple(getattr(catalog, field.name) for field in fields(catalog))
+    try:
+        os.makedirs(os.path.dirname(cache), exist_ok=True)
+        temporary = f"{cache}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as file:
+            file.write(marshal.dumps((stamp, tables)))
+        os.replace(temporary, cache)
+    except OSError:
+        pass
+
+    return catalog
+
+
+CATALOG = load()
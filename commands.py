@@ -0,0 +1,305 @@
+# MIT License
+#
+# Copyright (c) 2023 Kovács József Miklós
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from player import (
+    Player,
+    NotEnoughCookie,
+    NotPositiveNumber,
+    NotEnoughFactory,
+    EffectAlreadyExist,
+    InvalidOrder,
+    Order,
+)
+from factory import Factory
+from effect import ObtainableEffect, PurchasableEffect
+from cookie import Cookie
+from catalog import CATALOG
+
+HELP = [
+    "Commands:",
+    "\tcookie",
+    "\tcookies",
+    "\tfactories",
+    "\t<buy/sell> <factory-name> <quantity>",
+    "\tbuy <factory-name> max",
+    "\teffects",
+    "\tbuy <effect-name>",
+    "\t<order>; <order>; ...",
+    "\tlucky",
+    "\tachievements",
+    "\tquit",
+]
+
+# What a try of luck can give, and how often
+LUCK_DROPS = (None, *ObtainableEffect)
+LUCK_WEIGHTS = (CATALOG.no_drop_weight, *(e.drop_weight for e in ObtainableEffect))
+
+
+def _parse_order(item: str, quantity: str) -> tuple[Factory, int] | str:
+    """Returns the factory and quantity of the order, or the reason why it is invalid"""
+
+    try:
+        factory = Factory(item)
+    except ValueError as error:
+        return str(error)
+
+    try:
+        return factory, int(quantity)
+    except ValueError:
+        return "The quantity must be a whole positive number!"
+
+
+def _commit(player: Player) -> None:
+    """Wait until the player's operations are durable, if the player has a journal"""
+
+    if player.journal is not None:
+        player.journal.commit()
+
+
+def create_cookie(player: Player) -> list[str]:
+    with player.lock:
+        player.create_cookie()
+    _commit(player)
+    return [f"+1 {Cookie.COOKIE}"]
+
+
+def cookies(player: Player) -> list[str]:
+    return [
+        f"\t{cookie} : {quantity}"
+        for cookie, quantity in player.snapshot().cookies.items()
+    ]
+
+
+def factory_shop(player: Player) -> list[str]:
+    snapshot = player.snapshot()
+    lines = []
+    for item in Factory:
+        quantity = snapshot.factories.get(item, 0)
+        price = Player.get_next_factory_price(quantity, item.base_price)
+        lines.append(f"\t{item} : {price} ({quantity})")
+    return lines
+
+
+def buy_factory(player: Player, item: str, quantity: str) -> list[str]:
+    with player.lock:
+        if quantity == "max":
+            order = _parse_order(item, "1")
+            if isinstance(order, tuple):
+                order = order[0], max(player.max_affordable(order[0]), 1)
+        else:
+            order = _parse_order(item, quantity)
+        if isinstance(order, str):
+            return [order]
+
+        factory, quantity = order
+        try:
+            total_price = player.buy_factory(factory, quantity)
+        except (NotEnoughCookie, NotPositiveNumber) as error:
+            return str(error).split("\n")
+
+    _commit(player)
+    return [
+        f"-{total_price} {factory.type_of_currency}",
+        f"+{quantity} {factory.capitalize()}",
+    ]
+
+
+def sell_factory(player: Player, item: str, quantity: str) -> list[str]:
+    order = _parse_order(item, quantity)
+    if isinstance(order, str):
+        return [order]
+
+    factory, quantity = order
+    try:
+        with player.lock:
+            total_price = player.sell_factory(factory, quantity)
+    except (NotPositiveNumber, NotEnoughFactory) as error:
+        return str(error).split("\n")
+
+    _commit(player)
+    return [
+        f"-{quantity} {factory.capitalize()}",
+        f"+{total_price} {factory.type_of_currency}",
+    ]
+
+
+def effect_shop(player: Player) -> list[str]:
+    snapshot = player.snapshot()
+    lines = []
+    for item in PurchasableEffect:
+        if item.function in snapshot.buffs:
+            status = f"+ {snapshot.buffs[item.function]}s left"
+        elif item.function in snapshot.effects:
+            status = "+"
+        else:
+            status = item.base_price
+        lines.append(f"\t{item} : {status}")
+    return lines
+
+
+def buy_effect(player: Player, name: str) -> list[str]:
+    try:
+        item = PurchasableEffect(name)
+    except ValueError:
+        return [f"'{name}' is not a valid Effect"]
+
+    try:
+        with player.lock:
+            price = player.buy_effect(item)
+    except (EffectAlreadyExist, NotEnoughCookie) as error:
+        return str(error).split("\n")
+
+    _commit(player)
+    return [f"-{price} {item.type_of_currency}", f"+{item}"]
+
+
+def try_luck(player: Player) -> list[str]:
+    with player.lock:
+        effect = player.rng.choices(LUCK_DROPS, weights=LUCK_WEIGHTS, k=1)[0]
+
+        if effect is None:
+            return ["No, you are not lucky."]
+        if effect.function in player.effects:
+            return ["You already have a lot of luck."]
+        if effect.duration:
+            player.add_buff(effect.function, effect.duration)
+        else:
+            player.add_effect(effect.function)
+
+    _commit(player)
+    lines = ["You're really lucky!"]
+    if effect.message:
+        lines.append(effect.message)
+    return lines
+
+
+def achievements(player: Player) -> list[str]:
+    if player.achievements is None:
+        return ["Achievements are not tracked."]
+    with player.lock:
+        earned = list(player.achievements.earned)
+    return [f"\t{achievement}" for achievement in earned] or ["No achievements yet."]
+
+
+def announcements(player: Player) -> list[str]:
+    """Returns the lines announcing the achievements the player earned since the last time"""
+
+    if player.achievements is None:
+        return []
+    with player.lock:
+        new = player.achievements.take_new()
+
+    lines = []
+    for achievement in new:
+        lines.append(f"Achievement unlocked: {achievement}")
+        if achievement.reward is not None:
+            lines.append(f"+{achievement.reward}")
+    return lines
+
+
+def _parse_orders(line: str) -> list[Order] | str:
+    """Returns the orders separated by semicolons, or the reason why one is invalid"""
+
+    orders = []
+    for text in line.split(";"):
+        match text.split():
+            case [("buy" | "sell") as action, item, quantity]:
+                order = _parse_order(item, quantity)
+                if isinstance(order, str):
+                    return order
+                orders.append(Order(action, *order))
+            case ["buy", name]:
+                try:
+                    orders.append(Order("buy", PurchasableEffect(name)))
+                except ValueError:
+                    return f"'{name}' is not a valid Effect"
+            case _:
+                return f"'{text.strip()}' is not a valid order"
+    return orders
+
+
+def apply_orders(player: Player, line: str) -> list[str]:
+    orders = _parse_orders(line)
+    if isinstance(orders, str):
+        return [orders]
+
+    try:
+        receipt = player.apply_orders(orders)
+    except (
+        NotEnoughCookie,
+        NotPositiveNumber,
+        NotEnoughFactory,
+        EffectAlreadyExist,
+        InvalidOrder,
+    ) as error:
+        return str(error).split("\n")
+
+    _commit(player)
+    lines = []
+    for order, price in zip(receipt.orders, receipt.prices):
+        currency = order.item.type_of_currency
+        name = order.item.capitalize()
+        if order.action == "sell":
+            lines += [f"-{order.quantity} {name}", f"+{-price} {currency}"]
+        elif isinstance(order.item, Factory):
+            lines += [f"-{price} {currency}", f"+{order.quantity} {name}"]
+        else:
+            lines += [f"-{price} {currency}", f"+{order.item}"]
+    return lines
+
+
+def execute(player: Player, line: str) -> list[str]:
+    """Run one command of the menus, written on a single line
+
+    Args:
+        player: The player who gives the command
+        line: The command, for example 'buy takodachi 1' or 'buy luck'
+
+    Returns:
+        The lines of the answer, followed by the announcement of the new achievements
+    """
+
+    if ";" in line:
+        return apply_orders(player, line) + announcements(player)
+
+    match line.split():
+        case ["cookie"]:
+            lines = create_cookie(player)
+        case ["cookies"]:
+            lines = cookies(player)
+        case ["factories"]:
+            lines = factory_shop(player)
+        case ["effects"]:
+            lines = effect_shop(player)
+        case ["buy", item, quantity]:
+            lines = buy_factory(player, item, quantity)
+        case ["sell", item, quantity]:
+            lines = sell_factory(player, item, quantity)
+        case ["buy", name]:
+            lines = buy_effect(player, name)
+        case ["lucky"]:
+            lines = try_luck(player)
+        case ["achievements"]:
+            lines = achievements(player)
+        case _:
+            lines = HELP
+    return lines + announcements(player)
@@ -20,15 +20,30 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-from enum import StrEnum, unique, auto
+from enum import StrEnum, unique
 
+from catalog import CATALOG
 
-@unique
-class Cookie(StrEnum):
+
+class _Cookie(StrEnum):
     """The basic types of cookies, also known as in-game currency"""
 
-    COOKIE = auto()
-    DARK_CHOCOLATE_COOKIE = auto()
+    # The position of the member, assigned once the enum is built
+    ordinal: int
 
     def __str__(self) -> str:
         return self.value.replace("_", " ").capitalize()
+
+
+# The members are the cookies of the catalog, in its order
+Cookie = unique(
+    _Cookie(
+        "Cookie",
+        [(name.upper(), name) for name in CATALOG.cookies],
+        module=__name__,
+        qualname="Cookie",
+    )
+)
+Cookie.__doc__ = _Cookie.__doc__
+for ordinal, member in enumerate(Cookie):
+    member.ordinal = ordinal
@@ -0,0 +1,171 @@
+# MIT License
+#
+# Copyright (c) 2023 Kovács József Miklós
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from enum import Enum
+from functools import cache
+from typing import Generic, Iterable, Iterator, Mapping, TypeVar
+
+K = TypeVar("K", bound=Enum)
+
+
+@cache
+def _members(enum: type[K]) -> tuple[K, ...]:
+    return tuple(enum)
+
+
+class EnumCounter(Generic[K]):
+    """A Counter of enum members, stored as a list of integers indexed by the members' ordinal
+
+    Only the parts of Counter that the game uses are provided. Like a Counter,
+    a member is present once it was assigned, even if its count is zero, and
+    the plain value of a member can be used in its place. Members changed only
+    through the counts list directly are present while their count is not zero.
+    """
+
+    __slots__ = ("enum", "members", "counts", "present")
+
+    def __init__(self, enum: type[K], counts: Mapping[K, int] | None = None) -> None:
+        self.enum = enum
+        self.members = _members(enum)
+        self.counts = [0] * len(self.members)
+        # The bitmask of the members assigned since they were last deleted
+        self.present = 0
+        if counts is not None:
+            self.update(counts)
+
+    def _ordinal(self, key: object) -> int | None:
+        """Returns the ordinal of the member or of its value, or None if it is neither"""
+
+        if isinstance(key, self.enum):
+            return key.ordinal
+        try:
+            return self.enum(key).ordinal
+        except (ValueError, TypeError):
+            return None
+
+    def _has(self, ordinal: int) -> bool:
+        return self.counts[ordinal] != 0 or bool(self.present >> ordinal & 1)
+
+    def __getitem__(self, key: K) -> int:
+        try:
+            return self.counts[key.ordinal]
+        except AttributeError:
+            ordinal = self._ordinal(key)
+            return 0 if ordinal is None else self.counts[ordinal]
+
+    def __setitem__(self, key: K, count: int) -> None:
+        try:
+            ordinal = key.ordinal
+        except AttributeError:
+            ordinal = self._ordinal(key)
+            if ordinal is None:
+                raise KeyError(key) from None
+        self.counts[ordinal] = count
+        self.present |= 1 << ordinal
+
+    def __delitem__(self, key: K) -> None:
+        ordinal = self._ordinal(key)
+        if ordinal is None:
+            raise KeyError(key)
+        self.counts[ordinal] = 0
+        self.present &= ~(1 << ordinal)
+
+    def __contains__(self, key: object) -> bool:
+        ordinal = self._ordinal(key)
+        return ordinal is not None and self._has(ordinal)
+
+    def __iter__(self) -> Iterator[K]:
+        return (m for o, m in enumerate(self.members) if self._has(o))
+
+    def __len__(self) -> int:
+        return sum(1 for o in range(len(self.counts)) if self._has(o))
+
+    def __eq__(self, other: object) -> bool:
+        # Missing members count as zero, as for a Counter
+        if isinstance(other, EnumCounter):
+            return self.members == other.members and self.counts == other.counts
+        if isinstance(other, Mapping):
+            mine = {k: v for k, v in self.items() if v}
+            return mine == {k: v for k, v in other.items() if v}
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({dict(self.items())!r})"
+
+    def __iadd__(self, other: Mapping[K, int]) -> "EnumCounter[K]":
+        self.update(other)
+        return self
+
+    def __isub__(self, other: Mapping[K, int]) -> "EnumCounter[K]":
+        self.subtract(other)
+        return self
+
+    def get(self, key: object, default: int = 0) -> int:
+        ordinal = self._ordinal(key)
+        if ordinal is None or not self._has(ordinal):
+            return default
+        return self.counts[ordinal]
+
+    def keys(self) -> Iterable[K]:
+        return list(self)
+
+    def values(self) -> Iterable[int]:
+        return [count for _, count in self.items()]
+
+    def items(self) -> Iterable[tuple[K, int]]:
+        return [
+            (m, count)
+            for o, (m, count) in enumerate(zip(self.members, self.counts))
+            if count or self.present >> o & 1
+        ]
+
+    def update(self, other: Mapping[K, int]) -> None:
+        """Add the counts, like Counter.update"""
+
+        if isinstance(other, EnumCounter):
+            self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+            self.present |= other.present
+            return
+        counts = self.counts
+        for key, count in other.items():
+            ordinal = key.ordinal
+            counts[ordinal] += count
+            self.present |= 1 << ordinal
+
+    def subtract(self, other: Mapping[K, int]) -> None:
+        """Subtract the counts, like Counter.subtract"""
+
+        counts = self.counts
+        for key, count in other.items():
+            ordinal = key.ordinal
+            counts[ordinal] -= count
+            self.present |= 1 << ordinal
+
+    def clear(self) -> None:
+        self.counts = [0] * len(self.members)
+        self.present = 0
+
+    def copy(self) -> "EnumCounter[K]":
+        counter = EnumCounter(self.enum)
+        counter.counts = self.counts.copy()
+        counter.present = self.present
+        return counter
@@ -0,0 +1,204 @@
+# MIT License
+#
+# Copyright (c) 2023 Kovács József Miklós
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import time
+import curses
+
+import commands
+
+from cookie import Cookie
+from factory import Factory
+from player import Player, PlayerSnapshot
+
+# The keys 1, 2, ... buy one of the first nine factories
+KEYS = "c: cookie  l: lucky  1-{}: buy a factory  q: quit"
+BUYABLE = min(len(Factory), 9)
+
+
+class PriceCache:
+    """The next price of every factory, only calculated again when the owned quantity changes"""
+
+    __slots__ = ("_prices",)
+
+    def __init__(self) -> None:
+        self._prices: dict[Factory, tuple[int, int]] = {}
+
+    def price(self, factory: Factory, quantity: int) -> int:
+        """Returns the price of the next factory when the quantity is owned"""
+
+        cached = self._prices.get(factory)
+        if cached is None or cached[0] != quantity:
+            price = Player.get_next_factory_price(quantity, factory.base_price)
+            cached = self._prices[factory] = (quantity, price)
+        return cached[1]
+
+
+def render(
+    snapshot: PlayerSnapshot, prices: PriceCache, message: list[str]
+) -> list[str]:
+    """Returns the rows of the frame showing the snapshot"""
+
+    rows = ["~Cookie-factory~", ""]
+    for cookie in Cookie:
+        amount = snapshot.cookies.get(cookie, 0)
+        rate = snapshot.rate.get(cookie, 0)
+        rows.append(f"{str(cookie):<24}{amount:>20} +{rate}/s")
+
+    rows += ["", "~Factories~"]
+    for key, factory in enumerate(Factory, 1):
+        quantity = snapshot.factories.get(factory, 0)
+        price = prices.price(factory, quantity)
+        currency = factory.type_of_currency
+        label = f"{key}. {factory}" if key <= BUYABLE else f"   {factory}"
+        rows.append(f"{label:<24}{quantity:>20} next: {price} {currency}")
+
+    rows += ["", "~Effects~"]
+    for effect in sorted(snapshot.effects, key=lambda effect: effect.__name__):
+        name = effect.__name__.replace("_", " ").capitalize()
+        if effect in snapshot.buffs:
+            name += f" ({snapshot.buffs[effect]}s left)"
+        rows.append(f"\t{name}".expandtabs(4))
+
+    # The message is last, so the rows above stay in place when it changes
+    rows += ["", KEYS.format(BUYABLE), "", *message]
+    return rows
+
+
+def diff(previous: list[str], current: list[str]) -> list[tuple[int, int, str]]:
+    """Returns the changed runs of cells between two frames
+
+    Returns:
+        The row, column and text of every run to be written, a row that got
+        shorter ends in spaces covering its old cells
+    """
+
+    changes = []
+    for y in range(max(len(previous), len(current))):
+        old = previous[y] if y < len(previous) else ""
+        new = current[y] if y < len(current) else ""
+        if old == new:
+            continue
+        new = new.ljust(len(old))
+
+        x = 0
+        while x < len(new):
+            if x < len(old) and old[x] == new[x]:
+                x += 1
+                continue
+            start = x
+            while x < len(new) and (x >= len(old) or old[x] != new[x]):
+                x += 1
+            changes.append((y, start, new[start:x]))
+    return changes
+
+
+class Dashboard:
+    """A live view of the player, redrawn at a fixed frame rate
+
+    Every frame is rendered from a snapshot of the player, which is only taken
+    when the player's lock is free, otherwise the previous snapshot is shown
+    again, so drawing never holds up the production. Only the cells that
+    changed since the previous frame are written to the terminal.
+    """
+
+    def __init__(self, player: Player, fps: float = 10.0) -> None:
+        self.player = player
+        self.interval = 1 / fps
+        self.prices = PriceCache()
+        self.message: list[str] = []
+        self._snapshot: PlayerSnapshot | None = None
+        self._frame: list[str] = []
+
+    def snapshot(self) -> PlayerSnapshot:
+        """Returns a fresh snapshot of the player, or the previous one while the player is busy"""
+
+        lock = self.player.lock
+        if self._snapshot is None:
+            self._snapshot = self.player.snapshot()
+        elif lock.acquire(blocking=False):
+            try:
+                self._snapshot = self.player.snapshot()
+            finally:
+                lock.release()
+        return self._snapshot
+
+    def draw(self, screen: "curses.window") -> None:
+        """Write the cells of the next frame that differ from the previous one"""
+
+        frame = render(self.snapshot(), self.prices, self.message)
+        height, width = screen.getmaxyx()
+        # The bottom right cell cannot be written without moving the cursor out
+        frame = [row[: width - 1] for row in frame[: height - 1]]
+
+        for y, x, text in diff(self._frame, frame):
+            screen.addstr(y, x, text)
+        self._frame = frame
+        screen.noutrefresh()
+        curses.doupdate()
+
+    def handle(self, key: int) -> bool:
+        """Run the command of the key
+
+        Returns:
+            False if the dashboard should be closed
+        """
+
+        match chr(key) if 0 <= key < 0x110000 else "":
+            case "q":
+                return False
+            case "c":
+                self.message = commands.create_cookie(self.player)
+            case "l":
+                self.message = commands.try_luck(self.player)
+            case digit if len(digit) == 1 and digit in "123456789"[:BUYABLE]:
+                factory = list(Factory)[int(digit) - 1]
+                self.message = commands.buy_factory(self.player, factory.value, "1")
+        self.message += commands.announcements(self.player)
+        return True
+
+    def run(self, screen: "curses.window") -> None:
+        """Draw the frames and handle the keys until 'q' is pressed"""
+
+        curses.curs_set(0)
+        screen.clear()
+        next_frame = time.monotonic()
+        while True:
+            self.draw(screen)
+
+            # The keys pressed are handled while waiting for the next frame
+            next_frame += self.interval
+            while (left := next_frame - time.monotonic()) > 0:
+                screen.timeout(max(int(left * 1000), 1))
+                key = screen.getch()
+                if key == curses.KEY_RESIZE:
+                    screen.clear()
+                    self._frame = []
+                elif key != -1 and not self.handle(key):
+                    return
+            # A late frame is not made up for, the next one is a whole interval later
+            next_frame = max(next_frame, time.monotonic())
+
+
+def show(player: Player, fps: float = 10.0) -> None:
+    """Show the dashboard of the player in the terminal until 'q' is pressed"""
+
+    curses.wrapper(Dashboard(player, fps).run)
@@ -20,16 +20,23 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import time
 import random
 import copy
 
-from functools import reduce
-from typing import Callable
-from enum import StrEnum, auto, unique
+import metrics
+
+from collections import Counter
+from dataclasses import dataclass
+from functools import reduce, cache
+from typing import Callable, Iterable, Iterator, Mapping
+from enum import StrEnum, unique
 
 from factory import Factory, FactoryInfo
 from cookie import Cookie
-
+from sampling import binomial
+from catalog import CATALOG, CatalogError, Rule
+from metrics import Histogram, histogram, timed
 
 EffectFn = Callable[[FactoryInfo], FactoryInfo]
 
@@ -43,81 +50,349 @@ def effect_composition(*func: EffectFn) -> EffectFn:
     return reduce(compose, func, lambda x: x)
 
 
-def inanis(factory: FactoryInfo) -> FactoryInfo:
-    """Make the Takodachi factory to produce twice as many cookies"""
+@dataclass(frozen=True)
+class Multiply:
+    """Multiplies the amount of a cookie produced by a factory (or by every factory)"""
+
+    factor: int
+    cookie: Cookie
+    factory: Factory | None = None
+
+    def apply(self, factory: FactoryInfo) -> None:
+        """Apply the rule to the factory in place"""
+
+        if self.factory is None or self.factory is factory.type:
+            if self.cookie in factory.production_volume:
+                factory.production_volume[self.cookie] *= self.factor
+
+
+@dataclass(frozen=True)
+class Bonus:
+    """Chance to add the amount to every cookie the factory produces"""
+
+    amount: int
+    weights: tuple[int, int]
+
+    def apply(self, factory: FactoryInfo) -> None:
+        """Roll the bonus and apply it to the factory in place"""
+
+        if random.choices((True, False), weights=self.weights, k=1)[0]:
+            for cookie in factory.production_volume.keys():
+                factory.production_volume[cookie] += self.amount
+
+
+EffectRule = Multiply | Bonus
+
+
+def rule_effect(name: str, description: str, rules: tuple[EffectRule, ...]) -> EffectFn:
+    """Returns the effect function applying the rules to a copy of the factory"""
+
+    def effect(factory: FactoryInfo) -> FactoryInfo:
+        _factory = copy.deepcopy(factory)
+        for rule in rules:
+            rule.apply(_factory)
+        return _factory
+
+    effect.__name__ = effect.__qualname__ = name
+    effect.__doc__ = description
+    return effect
+
+
+def _rule(rule: Rule) -> EffectRule:
+    match rule:
+        case ("multiply", factor, cookie, factory):
+            return Multiply(
+                factor, COOKIES[cookie], FACTORIES[factory] if factory >= 0 else None
+            )
+        case ("bonus", amount, success, failure):
+            return Bonus(amount, (success, failure))
+    raise CatalogError(f"Unknown rule: {rule!r}")
+
+
+COOKIES: tuple[Cookie, ...] = tuple(Cookie)
+FACTORIES: tuple[Factory, ...] = tuple(Factory)
 
-    _factory = copy.deepcopy(factory)
-    if _factory.type is Factory.TAKODACHI:
-        _factory.production_volume[Cookie.COOKIE] *= 2
-    return _factory
 
+def _effect_rules() -> dict[EffectFn, tuple[EffectRule, ...]]:
+    effect_rules = {}
+    for name, description, rules in zip(
+        CATALOG.effects, CATALOG.effect_descriptions, CATALOG.effect_rules
+    ):
+        compiled = tuple(_rule(rule) for rule in rules)
+        effect_rules[rule_effect(name, description, compiled)] = compiled
+    return effect_rules
 
-def darkness(factory: FactoryInfo) -> FactoryInfo:
-    """Doubles the amount of Dark chocolate cookie produced by the factory"""
 
-    _factory = copy.deepcopy(factory)
-    if Cookie.DARK_CHOCOLATE_COOKIE in _factory.production_volume:
-        _factory.production_volume[Cookie.DARK_CHOCOLATE_COOKIE] *= 2
-    return _factory
+EFFECT_RULES: dict[EffectFn, tuple[EffectRule, ...]] = _effect_rules()
 
+# Every effect function in a fixed order, giving their bit in an EffectSet
+EFFECTS: tuple[EffectFn, ...] = tuple(EFFECT_RULES)
+EFFECT_ORDINALS: dict[EffectFn, int] = {e: i for i, e in enumerate(EFFECTS)}
 
-def luck(factory: FactoryInfo) -> FactoryInfo:
-    """Chance to add five of every cookie the factory produces"""
 
-    _factory = copy.deepcopy(factory)
-    if random.choices((True, False), weights=[1, 50], k=1)[0]:
-        for cookie in _factory.production_volume.keys():
-            _factory.production_volume[cookie] += 5
-    return _factory
+class EffectSet:
+    """A set of effect functions stored as a bitmask of their ordinal in EFFECTS"""
 
+    __slots__ = ("mask",)
 
-@unique
-class PurchasableEffect(StrEnum):
+    def __init__(self, effects: Iterable[EffectFn] = ()) -> None:
+        self.mask = 0
+        for effect in effects:
+            self.add(effect)
+
+    def __contains__(self, effect: object) -> bool:
+        ordinal = EFFECT_ORDINALS.get(effect)
+        return ordinal is not None and bool(self.mask >> ordinal & 1)
+
+    def __iter__(self) -> Iterator[EffectFn]:
+        return (e for i, e in enumerate(EFFECTS) if self.mask >> i & 1)
+
+    def __len__(self) -> int:
+        return self.mask.bit_count()
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, EffectSet):
+            return self.mask == other.mask
+        if isinstance(other, (set, frozenset)):
+            return set(self) == other
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"EffectSet({[e.__name__ for e in self]!r})"
+
+    def add(self, effect: EffectFn) -> None:
+        self.mask |= 1 << EFFECT_ORDINALS[effect]
+
+    def discard(self, effect: EffectFn) -> None:
+        if effect in EFFECT_ORDINALS:
+            self.mask &= ~(1 << EFFECT_ORDINALS[effect])
+
+
+class ProductionTable:
+    """The production of every factory under a set of effects, compiled from the effect rules
+
+    The multipliers are applied before the bonuses, which is one of the orders
+    the composition of the effect functions can produce. The multipliers cost
+    nothing once compiled, the time spent rolling the bonuses of an effect is
+    recorded in its "effect.<name>" histogram when the metrics are enabled.
+    """
+
+    def __init__(self, effects: Iterable[EffectFn]) -> None:
+        effects = list(effects)
+        rules = [rule for effect in effects for rule in EFFECT_RULES[effect]]
+
+        self.volumes: dict[Factory, dict[Cookie, int]] = {}
+        self.bonuses: dict[Factory, tuple[tuple[Bonus, dict[Cookie, int]], ...]] = {}
+        self.costs: dict[Bonus, Histogram] = {
+            rule: histogram(f"effect.{effect.__name__}")
+            for effect in effects
+            for rule in EFFECT_RULES[effect]
+            if isinstance(rule, Bonus)
+        }
+
+        for factory in Factory:
+            volume = factory.production_volume
+            for rule in rules:
+                if isinstance(rule, Multiply) and rule.cookie in volume:
+                    if rule.factory is None or rule.factory is factory:
+                        volume[rule.cookie] *= rule.factor
+
+            self.volumes[factory] = volume
+            self.bonuses[factory] = tuple(
+                (rule, {cookie: rule.amount for cookie in volume})
+                for rule in rules
+                if isinstance(rule, Bonus)
+            )
+
+    def rate(self, factory: Factory, quantity: int) -> Counter[Cookie]:
+        """Returns the cookies surely produced by the given quantity of factory in one second"""
+
+        return Counter(
+            {
+                cookie: amount * quantity
+                for cookie, amount in self.volumes[factory].items()
+            }
+        )
+
+    def max_bonus(self, factories: Mapping[Factory, int]) -> Counter[Cookie]:
+        """Returns the most bonus cookies the factories can win in one second"""
+
+        cookies: Counter[Cookie] = Counter()
+        for factory, quantity in factories.items():
+            for _, bonus in self.bonuses[factory]:
+                for cookie, amount in bonus.items():
+                    cookies[cookie] += amount * quantity
+        return cookies
+
+    def roll_bonus(
+        self,
+        factory: Factory,
+        quantity: int,
+        seconds: int = 1,
+        rng: random.Random | None = None,
+    ) -> Counter[Cookie]:
+        """Returns the bonus cookies won by the given quantity of factory in the given seconds"""
+
+        return self.roll_bonuses({factory: quantity}, seconds, rng)
+
+    def roll_bonuses(
+        self,
+        factories: Mapping[Factory, int],
+        seconds: int = 1,
+        rng: random.Random | None = None,
+    ) -> Counter[Cookie]:
+        """Returns the bonus cookies won by all the factories in the given seconds
+
+        Every bonus rule is drawn for all the factories at once, from the given
+        random generator or from the random module.
+        """
+
+        choices = rng.choices if rng is not None else random.choices
+        uniform = rng.random if rng is not None else random.random
+        rolls: dict[Bonus, list[tuple[int, dict[Cookie, int]]]] = {}
+        for factory, quantity in factories.items():
+            if quantity > 0:
+                for rule, bonus in self.bonuses[factory]:
+                    rolls.setdefault(rule, []).append((quantity, bonus))
+
+        cookies: Counter[Cookie] = Counter()
+        for rule, entries in rolls.items():
+            start = time.perf_counter_ns() if metrics.enabled else 0
+            if seconds == 1:
+                # The same draws as random.choices((True, False), weights=rule.weights)
+                wins = choices((1, 0), weights=rule.weights, k=len(entries))
+            else:
+                success, failure = rule.weights
+                probability = success / (success + failure)
+                wins = [binomial(seconds, probability, uniform) for _ in entries]
+
+            for (quantity, bonus), won in zip(entries, wins):
+                for cookie, amount in bonus.items():
+                    cookies[cookie] += amount * quantity * won
+
+            if start:
+                self.costs[rule].record(time.perf_counter_ns() - start)
+
+        return cookies
+
+    def produce(self, factory: Factory, quantity: int) -> Counter[Cookie]:
+        """Returns the cookies produced by the given quantity of factory in one second"""
+
+        return self.rate(factory, quantity) + self.roll_bonus(factory, quantity)
+
+
+@cache
+@timed("effect.compile")
+def compile_effects(effects: frozenset[EffectFn]) -> ProductionTable:
+    """Returns the shared production table of the effect set"""
+
+    return ProductionTable(effects)
+
+
+class _PurchasableEffect(StrEnum):
     """Effects that the player can buy"""
 
-    LUCK = auto()
+    # The position of the member, assigned once the enum is built
+    ordinal: int
 
     @property
     def function(self) -> EffectFn:
         """Returns the corresponding effect function"""
 
-        return {
-            PurchasableEffect.LUCK: luck,
-        }[self]
+        return PURCHASABLE_FUNCTIONS[self.ordinal]
 
     @property
     def base_price(self) -> int:
         """Returns the price of the effect"""
 
-        return {
-            PurchasableEffect.LUCK: 50,
-        }[self]
+        return PURCHASABLE_PRICES[self.ordinal]
 
     @property
     def type_of_currency(self) -> Cookie:
         """Returns the type of currency"""
 
-        return Cookie.DARK_CHOCOLATE_COOKIE
+        return PURCHASABLE_CURRENCIES[self.ordinal]
+
+    @property
+    def duration(self) -> int:
+        """Returns the seconds the effect lasts for after buying it, or 0 if it is permanent"""
+
+        return PURCHASABLE_DURATIONS[self.ordinal]
 
     def __str__(self) -> str:
         return self.value.capitalize()
 
 
-@unique
-class ObtainableEffect(StrEnum):
+class _ObtainableEffect(StrEnum):
     """Effects that the player can obtain from various game mechanics"""
 
-    INANIS = auto()
-    DARKNESS = auto()
+    # The position of the member, assigned once the enum is built
+    ordinal: int
 
     @property
     def function(self) -> EffectFn:
         """Returns the corresponding effect function"""
 
-        return {
-            ObtainableEffect.INANIS: inanis,
-            ObtainableEffect.DARKNESS: darkness,
-        }[self]
+        return OBTAINABLE_FUNCTIONS[self.ordinal]
+
+    @property
+    def drop_weight(self) -> int:
+        """Returns how likely a try of luck gives the effect, see commands.try_luck"""
+
+        return OBTAINABLE_WEIGHTS[self.ordinal]
+
+    @property
+    def message(self) -> str:
+        """Returns what the player is told when the effect is obtained"""
+
+        return OBTAINABLE_MESSAGES[self.ordinal]
+
+    @property
+    def duration(self) -> int:
+        """Returns the seconds the effect lasts for when it drops, or 0 if it is permanent"""
+
+        return OBTAINABLE_DURATIONS[self.ordinal]
 
     def __str__(self) -> str:
         return self.name.capitalize()
+
+
+# The members are the effects of the catalog with a price or a drop, in its order
+PurchasableEffect = unique(
+    _PurchasableEffect(
+        "PurchasableEffect",
+        [(CATALOG.effects[i].upper(), CATALOG.effects[i]) for i in CATALOG.purchasable],
+        module=__name__,
+        qualname="PurchasableEffect",
+    )
+)
+PurchasableEffect.__doc__ = _PurchasableEffect.__doc__
+for ordinal, member in enumerate(PurchasableEffect):
+    member.ordinal = ordinal
+ObtainableEffect = unique(
+    _ObtainableEffect(
+        "ObtainableEffect",
+        [(CATALOG.effects[i].upper(), CATALOG.effects[i]) for i in CATALOG.obtainable],
+        module=__name__,
+        qualname="ObtainableEffect",
+    )
+)
+ObtainableEffect.__doc__ = _ObtainableEffect.__doc__
+for ordinal, member in enumerate(ObtainableEffect):
+    member.ordinal = ordinal
+
+# The catalog of the effects, indexed by the ordinal of the enums
+PURCHASABLE_FUNCTIONS: tuple[EffectFn, ...] = tuple(
+    EFFECTS[i] for i in CATALOG.purchasable
+)
+PURCHASABLE_PRICES: tuple[int, ...] = CATALOG.purchasable_prices
+PURCHASABLE_CURRENCIES: tuple[Cookie, ...] = tuple(
+    COOKIES[cookie] for cookie in CATALOG.purchasable_currencies
+)
+PURCHASABLE_DURATIONS: tuple[int, ...] = CATALOG.purchasable_durations
+OBTAINABLE_FUNCTIONS: tuple[EffectFn, ...] = tuple(
+    EFFECTS[i] for i in CATALOG.obtainable
+)
+OBTAINABLE_WEIGHTS: tuple[int, ...] = CATALOG.obtainable_weights
+OBTAINABLE_MESSAGES: tuple[str, ...] = CATALOG.obtainable_messages
+OBTAINABLE_DURATIONS: tuple[int, ...] = CATALOG.obtainable_durations
@@ -20,53 +20,66 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-from enum import StrEnum, unique, auto
+from enum import StrEnum, unique
 from dataclasses import dataclass
 
 from cookie import Cookie
+from catalog import CATALOG
 
 
-@unique
-class Factory(StrEnum):
+class _Factory(StrEnum):
     """The factories that the player can buy"""
 
-    TAKODACHI = auto()
-    ROBOT = auto()
-    FARM = auto()
-    MINE = auto()
+    # The position of the member, assigned once the enum is built
+    ordinal: int
 
     @property
     def production_volume(self) -> dict[Cookie, int]:
         """Returns the corresponding factory production volume"""
 
-        return {
-            Factory.TAKODACHI: {Cookie.COOKIE: 1},
-            Factory.ROBOT: {Cookie.COOKIE: 8},
-            Factory.FARM: {Cookie.COOKIE: 47},
-            Factory.MINE: {Cookie.COOKIE: 260, Cookie.DARK_CHOCOLATE_COOKIE: 1},
-        }[self]
+        return dict(PRODUCTION_VOLUMES[self.ordinal])
 
     @property
     def base_price(self) -> int:
         """Returns the price of the factory"""
 
-        return {
-            Factory.TAKODACHI: 5,
-            Factory.ROBOT: 67,
-            Factory.FARM: 733,
-            Factory.MINE: 8000,
-        }[self]
+        return BASE_PRICES[self.ordinal]
 
     @property
     def type_of_currency(self) -> Cookie:
         """Returns the type of currency"""
 
-        return Cookie.COOKIE
+        return CURRENCIES[self.ordinal]
 
     def __str__(self) -> str:
         return self.value.capitalize()
 
 
+# The members are the factories of the catalog, in its order
+Factory = unique(
+    _Factory(
+        "Factory",
+        [(name.upper(), name) for name in CATALOG.factories],
+        module=__name__,
+        qualname="Factory",
+    )
+)
+Factory.__doc__ = _Factory.__doc__
+for ordinal, member in enumerate(Factory):
+    member.ordinal = ordinal
+
+# The catalog of the factories, indexed by their ordinal
+COOKIES: tuple[Cookie, ...] = tuple(Cookie)
+PRODUCTION_VOLUMES: tuple[dict[Cookie, int], ...] = tuple(
+    {COOKIES[cookie]: amount for cookie, amount in volume}
+    for volume in CATALOG.factory_volumes
+)
+BASE_PRICES: tuple[int, ...] = CATALOG.factory_prices
+CURRENCIES: tuple[Cookie, ...] = tuple(
+    COOKIES[cookie] for cookie in CATALOG.factory_currencies
+)
+
+
 @dataclass
 class FactoryInfo:
     """Contains the necessary information about the factory in a changeable form"""
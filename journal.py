@@ -0,0 +1,325 @@
+# MIT License
+#
+# Copyright (c) 2023 Kovács József Miklós
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import os
+import re
+import json
+import time
+import threading
+
+from typing import Callable, Iterator
+
+import snapshot
+
+from effect import EFFECTS, PurchasableEffect
+from factory import Factory
+from player import Player
+
+_SEGMENT = re.compile(r"journal\.(\d+)$")
+_SNAPSHOT = re.compile(r"snapshot\.(\d+)$")
+
+
+class Recorder:
+    """Records the operations of one player into a journal"""
+
+    __slots__ = ("journal", "index")
+
+    def __init__(self, journal: "Journal", index: int) -> None:
+        self.journal = journal
+        self.index = index
+
+    def record(self, operation: str, *arguments: str | int | list[int]) -> int:
+        return self.journal.record(self.index, operation, *arguments)
+
+    def commit(self) -> None:
+        self.journal.commit()
+
+
+class Journal:
+    """An append-only journal of the players' operations, on top of the latest snapshot
+
+    The directory holds numbered journal segments and a snapshot folding every
+    segment up to its own number. Operations are appended to the newest segment
+    and written by a background thread in batches, with one fsync per batch
+    window (group commit); commit waits until everything recorded so far is on
+    the disk. The players are identified by their index in the snapshot.
+
+    Only the background thread touches the segment file, including switching
+    to the next one. If writing fails, the error is raised by every later
+    record, commit and rotate instead of waiting forever.
+    """
+
+    def __init__(self, directory: str, window: float = 0.005) -> None:
+        self.directory = directory
+        self.window = window
+        os.makedirs(directory, exist_ok=True)
+
+        self.segment = max(self._segments() + [self._snapshot_number()]) + 1
+        self._file = open(self._path("journal", self.segment), "ab")
+        # The lines to be written, a number switches to that segment
+        self._buffer: list[bytes | int] = []
+        self._recorded = 0
+        self._durable = 0
+        self._opened = self.segment
+        self._error: Exception | None = None
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._write, name="journal", daemon=True)
+        self._thread.start()
+
+    def __enter__(self) -> "Journal":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _path(self, kind: str, number: int) -> str:
+        return os.path.join(self.directory, f"{kind}.{number:08d}")
+
+    def _segments(self) -> list[int]:
+        names = (_SEGMENT.match(name) for name in os.listdir(self.directory))
+        return sorted(int(match.group(1)) for match in names if match)
+
+    def _snapshot_number(self) -> int:
+        names = (_SNAPSHOT.match(name) for name in os.listdir(self.directory))
+        return max((int(match.group(1)) for match in names if match), default=0)
+
+    def attach(self, player: Player, index: int) -> None:
+        """Record the operations of the player from now on"""
+
+        player.journal = Recorder(self, index)
+
+    def record(
+        self, index: int, operation: str, *arguments: str | int | list[int]
+    ) -> int:
+        """Append the operation of the player at the index
+
+        Returns:
+            The sequence number of the operation, see commit
+        """
+
+        line = json.dumps([index, operation, *arguments], separators=(",", ":"))
+        with self._condition:
+            self._check()
+            if self._closed:
+                raise ValueError("The journal is closed!")
+            self._buffer.append(line.encode() + b"\n")
+            self._recorded += 1
+            self._condition.notify_all()
+            return self._recorded
+
+    def _check(self) -> None:
+        """Raise the error the writing failed with, the condition must be held"""
+
+        if self._error is not None:
+            raise self._error
+
+    def commit(self, sequence: int | None = None) -> None:
+        """Wait until the operations are durable, by default every operation recorded so far
+
+        Raises:
+            OSError: An error occurred if the journal could not be written
+        """
+
+        with self._condition:
+            target = self._recorded if sequence is None else sequence
+            while self._durable < target and not self._closed and self._error is None:
+                self._condition.wait()
+            self._check()
+
+    def _write(self) -> None:
+        """The group commit: write and fsync everything recorded during a window at once"""
+
+        while True:
+            with self._condition:
+                while not self._buffer and not self._closed:
+                    self._condition.wait()
+                if not self._buffer and self._closed:
+                    return
+
+            # Let the batch fill up
+            time.sleep(self.window)
+
+            with self._condition:
+                batch, self._buffer = self._buffer, []
+                sequence = self._recorded
+
+            try:
+                lines: list[bytes] = []
+                for item in batch:
+                    if isinstance(item, bytes):
+                        lines.append(item)
+                        continue
+                    self._flush(lines)
+                    lines = []
+                    self._file.close()
+                    self._file = open(self._path("journal", item), "ab")
+                    with self._condition:
+                        self._opened = item
+                self._flush(lines)
+            except Exception as error:
+                with self._condition:
+                    self._error = error
+                    self._condition.notify_all()
+                return
+
+            with self._condition:
+                self._durable = sequence
+                self._condition.notify_all()
+
+    def _flush(self, lines: list[bytes]) -> None:
+        if lines:
+            self._file.write(b"".join(lines))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def rotate(self) -> int:
+        """Continue in a new segment, once everything recorded so far is durable
+
+        Returns:
+            The number of the closed segment
+
+        Raises:
+            OSError: An error occurred if the journal could not be written
+        """
+
+        with self._condition:
+            self._check()
+            if self._closed:
+                raise ValueError("The journal is closed!")
+            closed, self.segment = self.segment, self.segment + 1
+            self._buffer.append(self.segment)
+            self._condition.notify_all()
+            while self._opened < self.segment and self._error is None:
+                self._condition.wait()
+            self._check()
+        return closed
+
+    def compact(self) -> None:
+        """Fold the closed segments into a fresh snapshot and remove them"""
+
+        folded = self.rotate()
+        players = recover(self.directory, until=folded)
+
+        # The snapshot is complete before anything it replaces is removed
+        snapshot.save(self._path("snapshot", folded), players)
+        for name in os.listdir(self.directory):
+            segment = _SEGMENT.match(name)
+            saved = _SNAPSHOT.match(name)
+            if segment and int(segment.group(1)) <= folded:
+                os.remove(os.path.join(self.directory, name))
+            elif saved and int(saved.group(1)) < folded:
+                os.remove(os.path.join(self.directory, name))
+
+    def close(self) -> None:
+        """Write everything recorded and stop the journal"""
+
+        try:
+            self.commit()
+        finally:
+            with self._condition:
+                self._closed = True
+                self._condition.notify_all()
+            self._thread.join()
+            self._file.close()
+
+
+def _replay(player: Player, operation: str, arguments: list) -> None:
+    match operation:
+        case "create_cookie":
+            player.create_cookie()
+        case "produce":
+            # The seconds are missing from the older journals
+            player.produce(*arguments)
+        case "buy_factory":
+            player.buy_factory(Factory(arguments[0]), arguments[1])
+        case "sell_factory":
+            player.sell_factory(Factory(arguments[0]), arguments[1])
+        case "buy_effect":
+            player.buy_effect(PurchasableEffect(arguments[0]))
+        case "add_effect":
+            effects = {effect.__name__: effect for effect in EFFECTS}
+            player.add_effect(effects[arguments[0]])
+        case "add_buff":
+            effects = {effect.__name__: effect for effect in EFFECTS}
+            player.add_buff(effects[arguments[0]], arguments[1])
+        case "remove_buff":
+            effects = {effect.__name__: effect for effect in EFFECTS}
+            player.remove_buff(effects[arguments[0]])
+        case _:
+            raise ValueError(f"Unknown operation in the journal: {operation}")
+
+
+def _entries(path: str) -> Iterator[list]:
+    with open(path, "rb") as file:
+        for line in file:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                return  # A torn write at the end of the last batch
+
+
+def recover(
+    directory: str,
+    until: int | None = None,
+    clock: Callable[[], float] | None = None,
+) -> list[Player]:
+    """Load the latest snapshot of the directory and replay the journal segments on it
+
+    Args:
+        directory: The directory of the journal
+        until: The number of the last segment to be replayed, by default all of them
+        clock: The clock of the recovered players from now on, see Player
+
+    Returns:
+        The players, a player recorded at a new index is created
+    """
+
+    players: list[Player] = []
+    names = [_SNAPSHOT.match(name) for name in os.listdir(directory)]
+    numbers = [int(match.group(1)) for match in names if match]
+    start = max(numbers, default=0)
+    if numbers:
+        with snapshot.Snapshot(
+            os.path.join(directory, f"snapshot.{start:08d}")
+        ) as saved:
+            players.extend(saved)
+
+    for name in sorted(os.listdir(directory)):
+        match = _SEGMENT.match(name)
+        if not match or int(match.group(1)) <= start:
+            continue
+        if until is not None and int(match.group(1)) > until:
+            continue
+
+        for index, operation, *arguments in _entries(os.path.join(directory, name)):
+            while len(players) <= index:
+                players.append(Player())
+            _replay(players[index], operation, arguments)
+
+    # The replay must not produce anything, so the clock is only set afterwards
+    if clock is not None:
+        for player in players:
+            player.clock = clock
+            player.last_settled_at = clock()
+
+    return players
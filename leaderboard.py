@@ -0,0 +1,319 @@
+# MIT License
+#
+# Copyright (c) 2023 Kovács József Miklós
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import threading
+
+from bisect import bisect_left, insort
+from typing import Iterator
+
+from cookie import Cookie
+from player import Player
+
+# (-score, order of joining) sorts the best score first, the earlier player first on ties
+Key = tuple[int, int]
+
+
+class RankIndex:
+    """A sorted list of keys split into buckets, with the number of keys before every bucket
+
+    Sizes of the buckets are kept in a Fenwick tree, so inserting, removing
+    and finding the position of a key take logarithmic time plus a shift of
+    at most a bucket's worth of references.
+    """
+
+    LOAD = 512
+
+    def __init__(self) -> None:
+        self._buckets: list[list[Key]] = []
+        self._maxes: list[Key] = []
+        self._tree: list[int] = []
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @classmethod
+    def from_sorted(cls, keys: list[Key]) -> "RankIndex":
+        """Returns the index of the keys, which must be sorted"""
+
+        index = cls()
+        index._buckets = [
+            keys[start : start + cls.LOAD] for start in range(0, len(keys), cls.LOAD)
+        ]
+        index._maxes = [bucket[-1] for bucket in index._buckets]
+        index._size = len(keys)
+        index._rebuild()
+        return index
+
+    def __iter__(self) -> Iterator[Key]:
+        for bucket in self._buckets:
+            yield from bucket
+
+    def _rebuild(self) -> None:
+        self._tree = [len(bucket) for bucket in self._buckets]
+        for index in range(len(self._tree)):
+            parent = index | (index + 1)
+            if parent < len(self._tree):
+                self._tree[parent] += self._tree[index]
+
+    def _add_size(self, index: int, delta: int) -> None:
+        while index < len(self._tree):
+            self._tree[index] += delta
+            index |= index + 1
+
+    def _before(self, index: int) -> int:
+        """Returns the number of keys in the buckets before the index"""
+
+        count = 0
+        while index > 0:
+            count += self._tree[index - 1]
+            index &= index - 1
+        return count
+
+    def insert(self, key: Key) -> None:
+        self._size += 1
+        if not self._buckets:
+            self._buckets.append([key])
+            self._maxes.append(key)
+            self._rebuild()
+            return
+
+        index = min(bisect_left(self._maxes, key), len(self._buckets) - 1)
+        bucket = self._buckets[index]
+        insort(bucket, key)
+        self._maxes[index] = bucket[-1]
+
+        if len(bucket) > 2 * self.LOAD:
+            self._buckets[index : index + 1] = [
+                bucket[: self.LOAD],
+                bucket[self.LOAD :],
+            ]
+            self._maxes[index : index + 1] = [bucket[self.LOAD - 1], bucket[-1]]
+            self._rebuild()
+        else:
+            self._add_size(index, 1)
+
+    def remove(self, key: Key) -> None:
+        index = bisect_left(self._maxes, key)
+        bucket = self._buckets[index]
+        del bucket[bisect_left(bucket, key)]
+        self._size -= 1
+
+        if bucket:
+            self._maxes[index] = bucket[-1]
+            self._add_size(index, -1)
+        else:
+            del self._buckets[index]
+            del self._maxes[index]
+            self._rebuild()
+
+    def replace(self, old: Key, new: Key) -> None:
+        """Replace a key, cheaply if the new key belongs to the same bucket"""
+
+        index = bisect_left(self._maxes, old)
+        if min(bisect_left(self._maxes, new), len(self._maxes) - 1) != index:
+            self.remove(old)
+            self.insert(new)
+            return
+
+        bucket = self._buckets[index]
+        del bucket[bisect_left(bucket, old)]
+        insort(bucket, new)
+        self._maxes[index] = bucket[-1]
+
+    def position(self, key: Key) -> int:
+        """Returns the number of keys before the key, which must be in the index"""
+
+        index = bisect_left(self._maxes, key)
+        return self._before(index) + bisect_left(self._buckets[index], key)
+
+    def first(self, count: int) -> list[Key]:
+        keys: list[Key] = []
+        for bucket in self._buckets:
+            if len(keys) >= count:
+                break
+            keys += bucket[: count - len(keys)]
+        return keys
+
+
+class Leaderboard:
+    """Ranks the players by their cookies and by their production rate of one cookie
+
+    A player on the board marks itself changed whenever its cookies or
+    factories change (see Player._record), which costs a set insertion, so
+    a tick of every player stays cheap. The changes are applied by flush, or
+    else before the next query: a few of them one by one in logarithmic time,
+    a lot of them by sorting all the keys again, which is nearly linear
+    because the order barely changes in a tick. When every player ticks, a
+    flush after the ticks (see TickScheduler.after_ticks) costs amortized
+    linear time per tick, and the queries stay logarithmic. Players with a
+    clock are ranked by their cookies as of their last settlement.
+    """
+
+    # Above this share of changed players the indexes are sorted again
+    REBUILD_RATIO = 1 / 16
+
+    def __init__(self, cookie: Cookie = Cookie.COOKIE) -> None:
+        self.cookie = cookie
+        self.by_cookies = RankIndex()
+        self.by_rate = RankIndex()
+
+        self._keys: dict[Player, tuple[Key, Key]] = {}
+        self._players: dict[int, Player] = {}
+        self._changed: set[Player] = set()
+        self._joined = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, player: object) -> bool:
+        return player in self._keys
+
+    def _scores(self, player: Player, joined: int) -> tuple[Key, Key]:
+        ordinal = self.cookie.ordinal
+        return (
+            (-player.cookies.counts[ordinal], joined),
+            (-player.rate.counts[ordinal], joined),
+        )
+
+    def add(self, player: Player) -> None:
+        """Put the player on the board, which it keeps up to date from now on"""
+
+        with self._lock:
+            if player in self._keys:
+                return
+            self._joined += 1
+            keys = self._scores(player, self._joined)
+            self._keys[player] = keys
+            self._players[self._joined] = player
+            self.by_cookies.insert(keys[0])
+            self.by_rate.insert(keys[1])
+        player.leaderboard = self
+
+    def remove(self, player: Player) -> None:
+        """Take the player off the board"""
+
+        with self._lock:
+            keys = self._keys.pop(player, None)
+            if keys is None:
+                return
+            self._changed.discard(player)
+            del self._players[keys[0][1]]
+            self.by_cookies.remove(keys[0])
+            self.by_rate.remove(keys[1])
+        if player.leaderboard is self:
+            player.leaderboard = None
+
+    def update(self, player: Player) -> None:
+        """Mark the scores of the player changed"""
+
+        with self._lock:
+            if player in self._keys:
+                self._changed.add(player)
+
+    def flush(self) -> None:
+        """Apply the changed scores to the indexes, so the next query does not have to"""
+
+        with self._lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        """Apply the changed scores to the indexes, the lock must be held"""
+
+        if not self._changed:
+            return
+
+        ordinal = self.cookie.ordinal
+        moves = []
+        for player in self._changed:
+            old = self._keys[player]
+            joined = old[0][1]
+            new = (
+                (-player.cookies.counts[ordinal], joined),
+                (-player.rate.counts[ordinal], joined),
+            )
+            if new != old:
+                self._keys[player] = new
+                moves.append((old, new))
+        self._changed.clear()
+
+        if len(moves) > len(self._keys) * self.REBUILD_RATIO:
+            # In the previous order, which is nearly sorted for the new keys
+            players = [self._players[joined] for _, joined in self.by_cookies]
+            self.by_cookies = RankIndex.from_sorted(
+                sorted([self._keys[player][0] for player in players])
+            )
+            players = [self._players[joined] for _, joined in self.by_rate]
+            self.by_rate = RankIndex.from_sorted(
+                sorted([self._keys[player][1] for player in players])
+            )
+            return
+
+        for old, new in moves:
+            for index, old_key, new_key in (
+                (self.by_cookies, old[0], new[0]),
+                (self.by_rate, old[1], new[1]),
+            ):
+                if old_key != new_key:
+                    index.replace(old_key, new_key)
+
+    def _top(self, ranking: str, count: int) -> list[tuple[Player, int]]:
+        with self._lock:
+            self._flush()
+            index = getattr(self, ranking)
+            return [
+                (self._players[joined], -score) for score, joined in index.first(count)
+            ]
+
+    def _rank(self, ranking: str, column: int, player: Player) -> int:
+        with self._lock:
+            self._flush()
+            return getattr(self, ranking).position(self._keys[player][column]) + 1
+
+    def top_by_cookies(self, count: int) -> list[tuple[Player, int]]:
+        """Returns the players with the most cookies and their cookies, best first"""
+
+        return self._top("by_cookies", count)
+
+    def top_by_rate(self, count: int) -> list[tuple[Player, int]]:
+        """Returns the players producing the most per second and their rates, best first"""
+
+        return self._top("by_rate", count)
+
+    def rank_by_cookies(self, player: Player) -> int:
+        """Returns the place of the player by cookies, starting from 1
+
+        Raises:
+            KeyError: An error occurred if the player is not on the board
+        """
+
+        return self._rank("by_cookies", 0, player)
+
+    def rank_by_rate(self, player: Player) -> int:
+        """Returns the place of the player by production rate, starting from 1
+
+        Raises:
+            KeyError: An error occurred if the player is not on the board
+        """
+
+        return self._rank("by_rate", 1, player)
@@ -22,52 +22,36 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import os
 import sys
-import threading
-import random
+import math
+import time
+import argparse
 
-from collections import Counter
+from typing import Callable
 
-from player import (
-    Player,
-    NotEnoughCookie,
-    TooMuchCookie,
-    NotPositiveNumber,
-    NotEnoughFactory,
-    EffectAlreadyExist,
-)
-from factory import Factory, FactoryInfo
-from effect import ObtainableEffect, PurchasableEffect, effect_composition
-from cookie import Cookie
+import metrics
+import script
+import commands
 
-timer_lock = threading.Lock()
+from player import Player
+from scheduler import TickScheduler
+from snapshot import Snapshot, save
+from journal import Journal, recover
+from script import SimulatedClock
+from achievements import track
 
 
-def buy_factory(player: Player, item: Factory, quantity: int) -> None:
-    try:
-        total_price = player.buy_factory(item, quantity)
-        print(f"-{total_price} {item.type_of_currency}")
-        print(f"+{quantity} {item.capitalize()}")
-    except (NotEnoughCookie, TooMuchCookie, NotPositiveNumber) as error:
-        print(error)
-
-
-def sell_factory(player: Player, item: Factory, quantity: int) -> None:
-    try:
-        total_price = player.sell_factory(item, quantity)
-        print(f"-{quantity} {item.capitalize()}")
-        print(f"+{total_price} {item.type_of_currency}")
-    except (NotPositiveNumber, NotEnoughFactory) as error:
-        print(error)
+def _print(lines: list[str]) -> None:
+    for line in lines:
+        print(line)
 
 
 def create_cookie_menu(player: Player) -> None:
     while True:
         match input("\nCookie? "):
             case "cookie":
-                with timer_lock:
-                    player.cookies[Cookie.COOKIE] += 1
-                print(f"+1 {Cookie.COOKIE}")
+                _print(commands.create_cookie(player))
             case "back" | "b":
                 break
             case _:
@@ -76,45 +60,19 @@ def create_cookie_menu(player: Player) -> None:
 
 def cookies_menu(player: Player) -> None:
     print("\n~Cookies~")
-    with timer_lock:
-        for cookie, quantity in player.cookies.items():
-            print(f"\t{cookie} : {quantity}")
+    _print(commands.cookies(player))
 
 
 def factory_shop_menu(player: Player) -> None:
-    def _is_valid(item: str, quantity: str) -> bool:
-        is_valid = False
-        try:
-            item = Factory(item)
-            quantity = int(quantity)
-            is_valid = True
-        except ValueError as error:
-            if str(error).endswith("is not a valid Factory"):
-                print(error)
-            else:
-                print("The quantity must be a whole positive number!")
-        return is_valid
-
     while True:
         print("\n~Factory shop~")
-
-        with timer_lock:
-            for item in Factory:
-                quantity = player.factories.get(item, 0)
-                price = Player.get_next_factory_price(
-                    player.factories[item], item.base_price
-                )
-                print(f"\t{item} : {price} ({quantity})")
+        _print(commands.factory_shop(player))
 
         match input("Choice: ").split():
             case ["buy", item, quantity]:
-                with timer_lock:
-                    if _is_valid(item, quantity):
-                        buy_factory(player, Factory(item), int(quantity))
+                _print(commands.buy_factory(player, item, quantity))
             case ["sell", item, quantity]:
-                with timer_lock:
-                    if _is_valid(item, quantity):
-                        sell_factory(player, Factory(item), int(quantity))
+                _print(commands.sell_factory(player, item, quantity))
             case ["back"] | ["b"]:
                 break
             case _:
@@ -122,33 +80,18 @@ def factory_shop_menu(player: Player) -> None:
                     "Write 'back'/'b' or for example",
                     "\n'buy takodachi 1'",
                     "\n<buy/sell> <factory-name> <quantity>",
+                    "\n<buy> <factory-name> max",
                 )
 
 
 def effect_shop_menu(player: Player) -> None:
     while True:
         print("\n~Effect shop~")
-
-        with timer_lock:
-            for item in PurchasableEffect:
-                status = "+" if item.function in player.effects else item.base_price
-                print(f"\t{item} : {status}")
+        _print(commands.effect_shop(player))
 
         match input("Choice: ").split():
             case ["buy", name]:
-                with timer_lock:
-                    try:
-                        item = PurchasableEffect(name)
-                    except ValueError as error:
-                        print(f"'{name}' is not a valid Effect")
-                        continue
-
-                    try:
-                        price = player.buy_effect(item)
-                        print(f"-{price} {item.type_of_currency}")
-                        print(f"+{PurchasableEffect(name)}")
-                    except (EffectAlreadyExist, NotEnoughCookie) as error:
-                        print(error)
+                _print(commands.buy_effect(player, name))
             case ["back"] | ["b"]:
                 break
             case _:
@@ -161,52 +104,12 @@ def effect_shop_menu(player: Player) -> None:
 
 def luck_menu(player: Player) -> None:
     print("\n~I'm lucky~")
+    _print(commands.try_luck(player))
 
-    effect = random.choices(
-        (None, ObtainableEffect.INANIS, ObtainableEffect.DARKNESS),
-        weights=(100, 1, 1),
-        k=1,
-    )[0]
-
-    with timer_lock:
-        if effect is None:
-            print("No, you are not lucky.")
-        elif effect.function in player.effects:
-            print("You already have a lot of luck.")
-        else:
-            print("You're really lucky!")
-            if effect == ObtainableEffect.INANIS:
-                print("Takodachis are working harder!")
-            elif effect == ObtainableEffect.DARKNESS:
-                print("Dark chocolate cookies..")
-            player.effects.add(effect.function)
-
-
-def timer(player: Player) -> None:
-    """A new thread dealing with the player's factories, which produce cookies every second"""
-
-    with timer_lock:
-        produce_cookies = effect_composition(*player.effects)
-        for factory, quantity in player.factories.items():
-            info = FactoryInfo(factory, factory.production_volume)
-            cookies = Counter(produce_cookies(info).production_volume)
-
-            for cookie in cookies.keys():
-                cookies[cookie] *= quantity
-
-            player.cookies += cookies
-
-    timer_thread = threading.Timer(1, timer, [player])
-    timer_thread.daemon = True
-    timer_thread.start()
-
-
-def main() -> None:
-    player = Player()
-
-    timer(player)
 
+def menu(player: Player) -> None:
     while True:
+        _print(commands.announcements(player))
         print(
             "\n~Menu~",
             "1. Cookies",
@@ -235,8 +138,119 @@ def main() -> None:
                 print("..?")
 
 
+def main(
+    lazy: bool = False,
+    save_path: str | None = None,
+    journal_path: str | None = None,
+    script_path: str | None = None,
+    step: float = 0.0,
+    seed: int | None = None,
+    fps: float | None = None,
+) -> None:
+    if script_path is not None:
+        clock: Callable[[], float] | None = SimulatedClock()
+    else:
+        clock = time.monotonic if lazy else None
+    journal = None
+    if journal_path is not None:
+        journal = Journal(journal_path)
+        players = recover(journal_path, clock=clock)
+        player = players[0] if players else Player(clock)
+        journal.attach(player, 0)
+    elif save_path is not None and os.path.exists(save_path):
+        with Snapshot(save_path) as snapshot:
+            player = snapshot.player(0, clock)
+    else:
+        player = Player(clock)
+    if seed is not None:
+        player.rng.seed(seed)
+    track(player)
+
+    if script_path is None and not lazy:
+        scheduler = TickScheduler()
+        scheduler.add(player)
+        scheduler.start()
+
+    try:
+        if isinstance(clock, SimulatedClock):
+            source = sys.stdin if script_path == "-" else open(script_path)
+            with source:
+                script.play(player, source, sys.stdout, clock, step)
+        elif fps is not None:
+            # Imported only here, as curses is missing on some platforms
+            import dashboard
+
+            dashboard.show(player, fps)
+        else:
+            menu(player)
+    finally:
+        if journal is not None:
+            journal.compact()
+            journal.close()
+        elif save_path is not None:
+            save(save_path, [player])
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cookie-factory")
+    parser.add_argument(
+        "--lazy",
+        action="store_true",
+        help="settle the cookies when they are needed instead of every second",
+    )
+    parser.add_argument(
+        "--save",
+        metavar="FILE",
+        help="load the game from the snapshot file and save it there on exit",
+    )
+    parser.add_argument(
+        "--journal",
+        metavar="DIR",
+        help="recover the game from the journal directory and record every operation there",
+    )
+    parser.add_argument(
+        "--script",
+        metavar="FILE",
+        help="run the commands of the file ('-' for the standard input) on simulated"
+        " time instead of the menus, writing their results as JSON lines",
+    )
+    parser.add_argument(
+        "--step",
+        type=float,
+        default=0.0,
+        metavar="SECONDS",
+        help="the simulated seconds passing between two commands of the script",
+    )
+    parser.add_argument(
+        "--seed", type=int, help="seed the player's luck, to replay a script exactly"
+    )
+    parser.add_argument(
+        "--dashboard",
+        nargs="?",
+        type=float,
+        const=10.0,
+        metavar="FPS",
+        help="show a live dashboard instead of the menus, redrawn FPS times a second"
+        " (default: 10)",
+    )
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    if not math.isfinite(args.step) or args.step < 0:
+        parser.error("the step must be a finite number of seconds, at least 0")
+    if args.dashboard is not None and args.dashboard <= 0:
+        parser.error("the frame rate of the dashboard must be positive")
+
+    metrics.start_from_args(args)
+
     try:
-        main()
+        main(
+            lazy=args.lazy,
+            save_path=args.save,
+            journal_path=args.journal,
+            script_path=args.script,
+            step=args.step,
+            seed=args.seed,
+            fps=args.dashboard,
+        )
     except KeyboardInterrupt:
         sys.exit()
@@ -0,0 +1,293 @@
+# MIT License
+#
+# Copyright (c) 2023 Kovács József Miklós
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import os
+import time
+import argparse
+import functools
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, ParamSpec, TypeVar
+
+P = ParamSpec("P")
+T = TypeVar("T")
+
+# Read on every instrumented call, so recording is switched on and off at once
+enabled = False
+
+_histograms: dict[str, "Histogram"] = {}
+_histograms_lock = threading.Lock()
+
+
+class Histogram:
+    """Counts durations in buckets of powers of two nanoseconds
+
+    Recording is a few integer operations without a lock. Concurrent records
+    may rarely lose a count, which does not matter for the distribution.
+    """
+
+    __slots__ = ("name", "buckets", "count", "total", "maximum")
+
+    BUCKETS = 64
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.buckets = [0] * self.BUCKETS
+        self.count = 0
+        self.total = 0
+        self.maximum = 0
+
+    def record(self, nanoseconds: int) -> None:
+        """Count a duration, negative ones are counted as zero"""
+
+        nanoseconds = max(nanoseconds, 0)
+        self.buckets[min(nanoseconds.bit_length(), self.BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += nanoseconds
+        if nanoseconds > self.maximum:
+            self.maximum = nanoseconds
+
+    def quantile(self, q: float) -> int:
+        """Returns the upper bound of the bucket of the q-quantile, in nanoseconds"""
+
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return min(2**index, self.maximum)
+        return self.maximum
+
+    def reset(self) -> None:
+        self.buckets = [0] * self.BUCKETS
+        self.count = 0
+        self.total = 0
+        self.maximum = 0
+
+    def __str__(self) -> str:
+        mean = self.total / self.count if self.count else 0.0
+        return (
+            f"{self.name} count={self.count} mean={mean / 1e3:.1f}us"
+            f" p50<={self.quantile(0.5) / 1e3:.1f}us"
+            f" p99<={self.quantile(0.99) / 1e3:.1f}us"
+            f" max={self.maximum / 1e3:.1f}us"
+        )
+
+
+def histogram(name: str) -> Histogram:
+    """Returns the histogram of the given name, created at the first use"""
+
+    try:
+        return _histograms[name]
+    except KeyError:
+        with _histograms_lock:
+            return _histograms.setdefault(name, Histogram(name))
+
+
+def enable() -> None:
+    global enabled
+    enabled = True
+
+
+def disable() -> None:
+    global enabled
+    enabled = False
+
+
+def reset() -> None:
+    """Forget everything recorded so far"""
+
+    for each in list(_histograms.values()):
+        each.reset()
+
+
+def report() -> str:
+    """Returns every histogram that recorded anything, one per line"""
+
+    lines = [str(each) for _, each in sorted(_histograms.items()) if each.count]
+    state = "on" if enabled else "off"
+    return "\n".join([f"# metrics {state}", *lines]) + "\n"
+
+
+def timed(name: str) -> Callable[[Callable[P, T]], Callable[P, T]]:
+    """Decorator recording the duration of every call in the named histogram"""
+
+    def decorator(function: Callable[P, T]) -> Callable[P, T]:
+        durations = histogram(name)
+
+        @functools.wraps(function)
+        def wrapper(*args: P.args, **kwargs: P.kwargs) -> T:
+            if not enabled:
+                return function(*args, **kwargs)
+
+            start = time.perf_counter_ns()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                durations.record(time.perf_counter_ns() - start)
+
+        return wrapper
+
+    return decorator
+
+
+class InstrumentedLock:
+    """A reentrant lock recording how long it was waited for and held
+
+    Only the outermost acquisition of the owner thread is measured, in the
+    "<name>.lock_wait" and "<name>.lock_hold" histograms.
+    """
+
+    __slots__ = ("_lock", "_wait", "_hold", "_depth", "_acquired_at")
+
+    def __init__(self, name: str) -> None:
+        self._lock = threading.RLock()
+        self._wait = histogram(f"{name}.lock_wait")
+        self._hold = histogram(f"{name}.lock_hold")
+        # Only changed by the thread owning the lock
+        self._depth = 0
+        self._acquired_at = 0
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        if not enabled:
+            if not self._lock.acquire(blocking, timeout):
+                return False
+            self._depth += 1
+            return True
+
+        start = time.perf_counter_ns()
+        if not self._lock.acquire(blocking, timeout):
+            return False
+        self._depth += 1
+        if self._depth == 1:
+            self._acquired_at = time.perf_counter_ns()
+            self._wait.record(self._acquired_at - start)
+        return True
+
+    def release(self) -> None:
+        self._depth -= 1
+        if self._depth == 0 and self._acquired_at:
+            self._hold.record(time.perf_counter_ns() - self._acquired_at)
+            self._acquired_at = 0
+        self._lock.release()
+
+    def __enter__(self) -> bool:
+        return self.acquire()
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.release()
+
+
+def start_dump(path: str, interval: float = 10.0) -> Callable[[], None]:
+    """Rewrite the file with the report every interval seconds on a daemon thread
+
+    Returns:
+        The function stopping the dumps
+    """
+
+    stopped = threading.Event()
+
+    def dump() -> None:
+        while not stopped.wait(interval):
+            temporary = f"{path}.tmp"
+            with open(temporary, "w") as file:
+                file.write(report())
+            os.replace(temporary, path)
+
+    threading.Thread(target=dump, name="metrics-dump", daemon=True).start()
+    return stopped.set
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """GET /metrics returns the report, POST /enable, /disable and /reset switch the recording"""
+
+    ACTIONS = {"/enable": enable, "/disable": disable, "/reset": reset}
+
+    def _answer(self, status: int, body: str) -> None:
+        data = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:
+        if self.path == "/metrics":
+            self._answer(200, report())
+        else:
+            self._answer(404, "Not found\n")
+
+    def do_POST(self) -> None:
+        if self.path in self.ACTIONS:
+            self.ACTIONS[self.path]()
+            self._answer(200, report())
+        else:
+            self._answer(404, "Not found\n")
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+
+def serve(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve the metrics over HTTP on a daemon thread, stopped by the shutdown of the server"""
+
+    server = ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(
+        target=server.serve_forever, name="metrics-server", daemon=True
+    ).start()
+    return server
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the command line options of the metrics to the parser, see start_from_args"""
+
+    parser.add_argument(
+        "--metrics",
+        metavar="FILE",
+        help="record the metrics and rewrite the file with them periodically",
+    )
+    parser.add_argument(
+        "--metrics-interval",
+        type=float,
+        default=10.0,
+        metavar="SECONDS",
+        help="how often the metrics file is rewritten (default: 10)",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        metavar="PORT",
+        help="record the metrics and serve them on http://127.0.0.1:PORT/metrics,"
+        " POST /enable, /disable or /reset switches the recording",
+    )
+
+
+def start_from_args(args: argparse.Namespace) -> None:
+    """Enable, dump and serve the metrics as the options added by add_arguments say"""
+
+    if args.metrics is not None or args.metrics_port is not None:
+        enable()
+    if args.metrics is not None:
+        start_dump(args.metrics, args.metrics_interval)
+    if args.metrics_port is not None:
+        serve(args.metrics_port)
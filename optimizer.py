@@ -0,0 +1,403 @@
+# MIT License
+#
+# Copyright (c) 2023 Kovács József Miklós
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import math
+import random
+import argparse
+import statistics
+
+from dataclasses import dataclass
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Sequence
+
+from cookie import Cookie
+from factory import Factory
+from effect import EffectFn, ProductionTable, PurchasableEffect, compile_effects
+from player import Player
+from price import price_table
+from sampling import geometric
+from commands import LUCK_DROPS, LUCK_WEIGHTS
+
+Item = Factory | PurchasableEffect
+# Timed effects run out, so they are no step of a build order
+ITEMS: tuple[Item, ...] = (
+    *Factory,
+    *(effect for effect in PurchasableEffect if not effect.duration),
+)
+
+
+@dataclass(frozen=True)
+class Estimate:
+    """The time a build order needs to reach the target, estimated from simulated runs"""
+
+    order: tuple[Item, ...]
+    seconds: float
+    low: float
+    high: float
+    reached: float
+    runs: int
+
+    def __str__(self) -> str:
+        groups: list[list] = []
+        for item in self.order:
+            if groups and groups[-1][1] is item:
+                groups[-1][0] += 1
+            else:
+                groups.append([1, item])
+
+        steps = ", ".join(f"{count} {item}" for count, item in groups)
+        return (
+            f"{self.seconds:.0f}s (95% between {self.low:.0f}s and {self.high:.0f}s,"
+            f" {self.reached:.0%} of {self.runs} runs reached the target)\n"
+            f"{steps or 'Buy nothing'}"
+        )
+
+
+def _price(item: Item, factories: Sequence[int]) -> int:
+    if isinstance(item, Factory):
+        return price_table(item.base_price).unit_price(factories[item.ordinal])
+    return item.base_price
+
+
+def _expected_rates(
+    table: ProductionTable, factories: Sequence[int], clicks: int
+) -> list[float]:
+    """Returns the cookies produced in a second on average, indexed by their ordinal"""
+
+    rates = [0.0] * len(Cookie)
+    rates[Cookie.COOKIE.ordinal] += clicks
+    for factory, quantity in zip(Factory, factories):
+        if quantity > 0:
+            for cookie, amount in table.volumes[factory].items():
+                rates[cookie.ordinal] += amount * quantity
+            for rule, bonus in table.bonuses[factory]:
+                success, failure = rule.weights
+                for cookie, amount in bonus.items():
+                    rates[cookie.ordinal] += (
+                        amount * quantity * success / (success + failure)
+                    )
+    return rates
+
+
+def greedy_order(target: int, clicks: int = 1, limit: int = 10000) -> tuple[Item, ...]:
+    """Returns the build order buying whatever pays for itself the soonest on average
+
+    Every step picks the item whose price is earned back the soonest, counting
+    the wait for the price, and buys it as long as it brings the target closer.
+    """
+
+    factories = [0] * len(Factory)
+    effects: set[EffectFn] = set()
+    cookies = [0.0] * len(Cookie)
+    order: list[Item] = []
+    goal = Cookie.COOKIE.ordinal
+
+    while len(order) < limit:
+        rates = _expected_rates(compile_effects(frozenset(effects)), factories, clicks)
+        remaining = max(target - cookies[goal], 0)
+        # Without clicks nothing makes the goal cookie until something is bought
+        finish = remaining / rates[goal] if rates[goal] > 0 else math.inf
+        best = None
+        best_payback = math.inf
+
+        for item in ITEMS:
+            if isinstance(item, PurchasableEffect) and item.function in effects:
+                continue
+            currency = item.type_of_currency.ordinal
+            price = _price(item, factories)
+            if rates[currency] <= 0:
+                continue
+
+            wait = max(price - cookies[currency], 0) / rates[currency]
+            after = [amount + rate * wait for amount, rate in zip(cookies, rates)]
+            after[currency] -= price
+
+            if isinstance(item, Factory):
+                bought = list(factories)
+                bought[item.ordinal] += 1
+                table = compile_effects(frozenset(effects))
+            else:
+                bought = factories
+                table = compile_effects(frozenset(effects | {item.function}))
+            rate = _expected_rates(table, bought, clicks)[goal]
+            if rate <= rates[goal]:
+                continue
+
+            payback = wait + price / (rate - rates[goal])
+            if payback < best_payback:
+                time = wait + max(target - after[goal], 0) / rate
+                best, best_payback, best_time, best_cookies = item, payback, time, after
+
+        if best is None or best_time >= finish:
+            break
+
+        order.append(best)
+        cookies = best_cookies
+        if isinstance(best, Factory):
+            factories[best.ordinal] += 1
+        else:
+            effects.add(best.function)
+
+    return tuple(order)
+
+
+class Simulation:
+    """One fast-forwarded game of a player following a build order
+
+    Besides the factories, the player makes cookies by hand (clicks per
+    second) and tries their luck (tries per second). The times of the luck
+    drops are drawn in advance, and the time waited for a price is skipped
+    with Player.advance in a few steps, so a run costs about the same
+    whatever its length in game time.
+    """
+
+    def __init__(
+        self,
+        target: int,
+        seed: int,
+        horizon: int,
+        clicks: int = 1,
+        tries: float = 1.0,
+    ) -> None:
+        self.target = target
+        self.horizon = horizon
+        self.clicks = clicks
+        self.player = Player(seed=seed)
+        self.elapsed = 0
+        # The expected rates, until the factories or effects change
+        self._rates: list[float] | None = None
+
+        self.drops: list[tuple[int, EffectFn]] = []
+        if tries > 0:
+            total = sum(LUCK_WEIGHTS)
+            for effect, weight in zip(LUCK_DROPS, LUCK_WEIGHTS):
+                if effect is not None and not effect.duration:
+                    attempts = geometric(weight / total, self.player.rng.random)
+                    self.drops.append((math.ceil(attempts / tries), effect.function))
+            self.drops.sort(key=lambda drop: drop[0])
+
+    def wait_for(self, cookie: Cookie, amount: int) -> bool:
+        """Fast-forward until the player has the amount of cookie
+
+        Returns:
+            False if it does not happen within the horizon
+        """
+
+        player = self.player
+        while player.cookies[cookie] < amount:
+            if self.elapsed >= self.horizon:
+                return False
+            if self._rates is None:
+                self._rates = _expected_rates(
+                    player.production, player.factories.counts, self.clicks
+                )
+            rate = self._rates[cookie.ordinal]
+            if rate <= 0:
+                return False
+
+            seconds = (amount - player.cookies[cookie]) / rate
+            seconds = min(max(math.floor(seconds), 1), self.horizon - self.elapsed)
+            if self.drops:
+                seconds = min(seconds, max(self.drops[0][0] - self.elapsed, 1))
+
+            player.advance(seconds)
+            player.cookies[Cookie.COOKIE] += self.clicks * seconds
+            self.elapsed += seconds
+
+            while self.drops and self.drops[0][0] <= self.elapsed:
+                _, effect = self.drops.pop(0)
+                if effect not in player.effects:
+                    player.add_effect(effect)
+                    self._rates = None
+
+        return True
+
+    def run(self, order: Iterable[Item]) -> tuple[int, bool]:
+        """Follow the build order, then wait for the target
+
+        Returns:
+            The seconds it took, or the horizon, and whether the target was reached
+        """
+
+        player = self.player
+        for item in order:
+            if isinstance(item, PurchasableEffect) and item.function in player.effects:
+                continue
+            price = _price(item, player.factories.counts)
+            if not self.wait_for(item.type_of_currency, price):
+                return self.horizon, False
+
+            if isinstance(item, Factory):
+                player.buy_factory(item, 1)
+            else:
+                player.buy_effect(item)
+            self._rates = None
+
+        if not self.wait_for(Cookie.COOKIE, self.target):
+            return self.horizon, False
+        return self.elapsed, True
+
+
+def evaluate(
+    order: tuple[Item, ...],
+    seeds: Sequence[int],
+    target: int,
+    horizon: int,
+    clicks: int = 1,
+    tries: float = 1.0,
+    confidence: float = 0.95,
+) -> Estimate:
+    """Simulate the build order once per seed
+
+    Runs not reaching the target are counted with the horizon, so the
+    estimate is optimistic for orders that often miss it.
+    """
+
+    outcomes = [
+        Simulation(target, seed, horizon, clicks, tries).run(order) for seed in seeds
+    ]
+    times = [seconds for seconds, _ in outcomes]
+    mean = statistics.fmean(times)
+    spread = 0.0
+    if len(times) > 1:
+        z = statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+        spread = z * statistics.stdev(times) / math.sqrt(len(times))
+
+    return Estimate(
+        order=order,
+        seconds=mean,
+        low=mean - spread,
+        high=mean + spread,
+        reached=sum(reached for _, reached in outcomes) / len(outcomes),
+        runs=len(outcomes),
+    )
+
+
+def mutate(order: tuple[Item, ...], rng: random.Random) -> tuple[Item, ...]:
+    """Returns the build order with one item moved, swapped, removed or added"""
+
+    items = list(order)
+    index = rng.randrange(len(items) + 1)
+    match rng.randrange(4) if items else 3:
+        case 0:
+            item = items.pop(min(index, len(items) - 1))
+            distance = max(1, len(items) // 10)
+            position = index + rng.randint(-distance, distance)
+            items.insert(min(max(position, 0), len(items)), item)
+        case 1 if len(items) > 1:
+            i = min(index, len(items) - 2)
+            items[i], items[i + 1] = items[i + 1], items[i]
+        case 2:
+            del items[min(index, len(items) - 1)]
+        case _:
+            items.insert(index, rng.choice(ITEMS))
+    return tuple(items)
+
+
+def optimize(
+    target: int,
+    horizon: int = 8 * 3600,
+    runs: int = 16,
+    candidates: int = 8,
+    rounds: int = 4,
+    clicks: int = 1,
+    tries: float = 1.0,
+    workers: int | None = None,
+    seed: int | None = None,
+) -> Estimate:
+    """Search for the build order reaching the target cookies the fastest
+
+    The search starts from the greedy order and improves it by local search:
+    every round the neighbours of the best order are simulated in parallel on
+    a process pool, all of them with the same seeds so that their differences
+    are not drowned out by luck.
+
+    Args:
+        target: The number of cookies to reach
+        horizon: The seconds after which a run is given up
+        runs: The number of simulated runs per build order
+        candidates: The number of build orders tried per round
+        rounds: The number of rounds of the local search
+        clicks: The cookies made by hand per second
+        tries: The tries of luck per second
+        workers: The number of processes, by default the number of CPUs
+        seed: Makes the search reproducible
+
+    Returns:
+        The estimate of the best build order found
+    """
+
+    rng = random.Random(seed)
+    seeds = [rng.getrandbits(64) for _ in range(runs)]
+    simulate = partial(
+        evaluate,
+        seeds=seeds,
+        target=target,
+        horizon=horizon,
+        clicks=clicks,
+        tries=tries,
+    )
+
+    with ProcessPoolExecutor(workers) as pool:
+        best = simulate(greedy_order(target, clicks))
+        seen = {best.order}
+        for _ in range(rounds):
+            neighbours = {mutate(best.order, rng) for _ in range(candidates)} - seen
+            seen |= neighbours
+            for estimate in pool.map(simulate, neighbours):
+                if estimate.seconds < best.seconds:
+                    best = estimate
+
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Find the fastest build order to reach a number of cookies"
+    )
+    parser.add_argument("target", type=int, help="the number of cookies to reach")
+    parser.add_argument("--horizon", type=int, default=8 * 3600, metavar="SECONDS")
+    parser.add_argument("--runs", type=int, default=16)
+    parser.add_argument("--candidates", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=4)
+    parser.add_argument("--clicks", type=int, default=1, help="per second")
+    parser.add_argument("--tries", type=float, default=1.0, help="of luck per second")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+    if args.clicks < 0:
+        parser.error("the clicks per second must not be negative")
+
+    print(
+        optimize(
+            args.target,
+            horizon=args.horizon,
+            runs=args.runs,
+            candidates=args.candidates,
+            rounds=args.rounds,
+            clicks=args.clicks,
+            tries=args.tries,
+            workers=args.workers,
+            seed=args.seed,
+        )
+    )
@@ -20,11 +20,31 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-from collections import Counter
+import math
+import random
+
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Callable, Iterable, Literal, Mapping
 
 from cookie import Cookie
 from factory import Factory
-from effect import EffectFn, PurchasableEffect
+from counter import EnumCounter
+from metrics import InstrumentedLock, timed
+from effect import (
+    EffectFn,
+    EffectSet,
+    PurchasableEffect,
+    ProductionTable,
+    compile_effects,
+)
+from price import price_table
+from wheel import TimingWheel
+
+if TYPE_CHECKING:
+    from journal import Recorder
+    from leaderboard import Leaderboard
+    from achievements import Progress
 
 
 class NotEnoughCookie(Exception):
@@ -47,13 +67,394 @@ class EffectAlreadyExist(Exception):
     pass
 
 
+class InvalidOrder(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class Order:
+    """An order to buy or sell a factory, or to buy an effect"""
+
+    action: Literal["buy", "sell"]
+    item: Factory | PurchasableEffect
+    quantity: int = 1
+
+
+@dataclass(frozen=True)
+class Receipt:
+    """The orders applied together and what they cost, selling earns a negative price"""
+
+    orders: tuple[Order, ...]
+    prices: tuple[int, ...]
+    spent: Mapping[Cookie, int]
+
+
+def _factory_purchase(factory: Factory, owned: int, balance: int, quantity: int) -> int:
+    """Returns the price of buying the quantity of factory on top of the owned ones
+
+    Raises:
+        NotPositiveNumber: An error occurred if the quantity is less than one
+        NotEnoughCookie: An error occurred if the balance is not enough for the factories
+    """
+
+    if quantity < 1:
+        raise NotPositiveNumber("The quantity must be a positive number!")
+
+    # The affordability is checked first, so an order far beyond the
+    # player's cookies never has to be priced exactly
+    table = price_table(factory.base_price)
+    affordable = table.max_quantity(owned, balance)
+    if quantity > affordable:
+        message = f"You don't have enough {factory.type_of_currency}!"
+        message += f"\nYou can afford at most {affordable} {factory}"
+
+        raise NotEnoughCookie(message)
+
+    return table.total(owned, quantity)
+
+
+def _factory_sale(factory: Factory, owned: int, quantity: int) -> int:
+    """Returns the price received for selling the quantity of the owned factories
+
+    Raises:
+        NotPositiveNumber: An error occurred if the quantity is less than one
+        NotEnoughFactory: An error occurred if fewer factories are owned than sold
+    """
+
+    if quantity < 1:
+        raise NotPositiveNumber("The quantity must be a positive number!")
+    if owned - quantity < 0:
+        raise NotEnoughFactory("You can't sell more than you have!")
+
+    return price_table(factory.base_price).total(owned - quantity, quantity)
+
+
+def _effect_purchase(
+    effect: "PurchasableEffect", effects: EffectSet, balance: int
+) -> int:
+    """Returns the price of buying the effect
+
+    Raises:
+        EffectAlreadyExist: An error occurred if the effect is among the effects
+        NotEnoughCookie: An error occurred if the balance is not enough for the effect
+    """
+
+    if effect.function in effects:
+        raise EffectAlreadyExist("You already bought this!")
+
+    price = effect.base_price
+    if price > balance:
+        message = f"You don't have enough {effect.type_of_currency}!"
+        message += f"\nIt costs {price} {effect.type_of_currency}"
+
+        raise NotEnoughCookie(message)
+
+    return price
+
+
+@dataclass(frozen=True)
+class PlayerSnapshot:
+    """An immutable copy of the cookies, factories, effects and rate of a player"""
+
+    cookies: Mapping[Cookie, int]
+    factories: Mapping[Factory, int]
+    effects: frozenset[EffectFn]
+    # The seconds left of the timed effects among the effects
+    buffs: Mapping[EffectFn, int]
+    # The sure production of a second, without the bonuses
+    rate: Mapping[Cookie, int]
+
+
 class Player:
-    """Contains cookies, factories and effects that the player has"""
+    """Contains cookies, factories and effects that the player has
+
+    Without a clock the cookies have to be produced by calling tick every second.
+    With a clock (returning the seconds of a monotonic clock) they are produced
+    lazily by settle, from the whole seconds elapsed since the last settlement.
+
+    Everything random about the player is drawn from its own generator, so the
+    same seed and the same commands always lead to the same state.
+
+    Timed effects (buffs) last for a number of produced seconds. Their ends
+    are kept on a timing wheel of the player's age, the seconds it has
+    produced, which is only created while the player has a buff, so players
+    without buffs pay nothing for them and expiring costs amortized O(1).
+
+    The player's own lock has to be held while its state is used, so players
+    never wait for each other.
+    """
+
+    __slots__ = (
+        "cookies",
+        "factories",
+        "effects",
+        "_production",
+        "rate",
+        "age",
+        "buffs",
+        "clock",
+        "last_settled_at",
+        "lock",
+        "journal",
+        "leaderboard",
+        "achievements",
+        "rng",
+    )
+
+    def __init__(
+        self, clock: Callable[[], float] | None = None, seed: int | None = None
+    ) -> None:
+        self.cookies: EnumCounter[Cookie] = EnumCounter(Cookie)
+        self.factories: EnumCounter[Factory] = EnumCounter(Factory)
+        self.effects = EffectSet()
+        # Updated by the methods below whenever the factories or effects change
+        self._production: ProductionTable | None = None
+        self.rate: EnumCounter[Cookie] = EnumCounter(Cookie)
+        self.age = 0
+        self.buffs: TimingWheel[EffectFn] | None = None
+        self.clock = clock
+        self.last_settled_at = clock() if clock is not None else 0.0
+        self.lock = InstrumentedLock("player")
+        self.journal: "Recorder | None" = None
+        self.leaderboard: "Leaderboard | None" = None
+        self.achievements: "Progress | None" = None
+        self.rng = random.Random(seed)
+
+    @property
+    def production(self) -> ProductionTable:
+        """The production table compiled from the player's effects"""
+
+        if self._production is None:
+            self._production = compile_effects(frozenset(self.effects))
+        return self._production
+
+    def snapshot(self) -> PlayerSnapshot:
+        """Returns a consistent copy of the player's state, which can be read without the lock"""
+
+        with self.lock:
+            self.settle()
+            return PlayerSnapshot(
+                MappingProxyType(dict(self.cookies.items())),
+                MappingProxyType(dict(self.factories.items())),
+                frozenset(self.effects),
+                MappingProxyType(
+                    {effect: self.remaining(effect) for effect in self.buffs or ()}
+                ),
+                MappingProxyType(dict(self.rate.items())),
+            )
+
+    @timed("player.add_effect")
+    def add_effect(self, effect: EffectFn) -> None:
+        """Add the effect to the player's effects
+
+        Args:
+            effect: The effect function the player gets
+        """
+
+        self.settle()
+        if self.buffs is not None and effect in self.buffs:
+            # The buff becomes permanent
+            self._unbuff(effect)
+        self.effects.add(effect)
+        self.refresh()
+        self._record("add_effect", effect.__name__)
+
+    def remaining(self, effect: EffectFn) -> int:
+        """Returns the seconds left of the buff
+
+        Raises:
+            KeyError: An error occurred if the effect is not a buff of the player
+        """
+
+        if self.buffs is None:
+            raise KeyError(effect)
+        return self.buffs.deadline(effect) - self.age
+
+    def _buff(self, effect: EffectFn, seconds: int) -> None:
+        if self.buffs is None:
+            self.buffs = TimingWheel(self.age)
+        self.buffs.schedule(effect, self.age + seconds)
+        self.effects.add(effect)
+
+    def _unbuff(self, effect: EffectFn) -> None:
+        if self.buffs is not None:
+            self.buffs.cancel(effect)
+            if not self.buffs:
+                self.buffs = None
+
+    @timed("player.add_buff")
+    def add_buff(self, effect: EffectFn, seconds: int) -> None:
+        """Add the effect to the player's effects for the given seconds of production
+
+        A buff the player already has lasts for the given seconds from now on.
+
+        Args:
+            effect: The effect function the player gets
+            seconds: The number of seconds the effect lasts for
+
+        Raises:
+            NotPositiveNumber: An error occurred if the seconds are less than one
+            EffectAlreadyExist: An error occurred if the player has the effect permanently
+        """
+
+        if seconds < 1:
+            raise NotPositiveNumber("The seconds must be a positive number!")
+
+        self.settle()
+
+        if effect in self.effects and (self.buffs is None or effect not in self.buffs):
+            raise EffectAlreadyExist("You already have this!")
+
+        self._buff(effect, seconds)
+        self.refresh()
+        self._record("add_buff", effect.__name__, seconds)
+
+    @timed("player.remove_buff")
+    def remove_buff(self, effect: EffectFn) -> None:
+        """Remove the buff from the player's effects before it runs out
+
+        Args:
+            effect: The effect function of the buff
+
+        Raises:
+            KeyError: An error occurred if the effect is not a buff of the player
+        """
+
+        self.settle()
+        if self.buffs is None or effect not in self.buffs:
+            raise KeyError(effect)
+        self._unbuff(effect)
+        self._expire(effect)
+
+    def _expire(self, effect: EffectFn) -> None:
+        """Remove the effect that is no longer on the wheel"""
+
+        self.effects.discard(effect)
+        self.refresh()
+        self._record("remove_buff", effect.__name__)
+
+    @timed("player.create_cookie")
+    def create_cookie(self) -> None:
+        """Add one cookie made by the player's own hands"""
+
+        self.cookies[Cookie.COOKIE] += 1
+        self._record("create_cookie")
 
-    def __init__(self) -> None:
-        self.cookies: Counter[Cookie] = Counter()
-        self.factories: Counter[Factory] = Counter()
-        self.effects: set[EffectFn] = set()
+    def _record(self, operation: str, *arguments: str | int | list[int]) -> None:
+        """Journal the operation, then check the player's achievements and leaderboard, if any"""
+
+        if self.journal is not None:
+            self.journal.record(operation, *arguments)
+        if self.achievements is not None:
+            self.achievements.check(self)
+        if self.leaderboard is not None:
+            self.leaderboard.update(self)
+
+    def refresh(self) -> None:
+        """Recompile the production, needed after the factories or effects were changed directly"""
+
+        self._production = None
+
+        self.rate = EnumCounter(Cookie)
+        for factory, quantity in self.factories.items():
+            self.rate.update(self.production.rate(factory, quantity))
+        if self.achievements is not None:
+            self.achievements.check(self)
+        if self.leaderboard is not None:
+            self.leaderboard.update(self)
+
+    def settle(self) -> None:
+        """Produce the cookies of the whole seconds elapsed since the last settlement
+
+        Only does something when the player has a clock, then it must be called
+        before the cookies are read or the production changes.
+        """
+
+        if self.clock is None:
+            return
+
+        seconds = math.floor(self.clock() - self.last_settled_at)
+        if seconds > 0:
+            # Moved first, so what happens while producing (an achievement's
+            # reward) finds the player settled and produces nothing again
+            self.last_settled_at += seconds
+            self.advance(seconds)
+
+    def tick(self) -> None:
+        """Produce the cookies of one second, only the bonuses are rolled factory by factory"""
+
+        self.advance(1)
+
+    @timed("player.advance")
+    def advance(self, seconds: int) -> None:
+        """Produce the cookies of the given number of seconds at once
+
+        The sure production is multiplied by the seconds, while the bonuses of
+        every factory are drawn from the distribution of the number of seconds
+        they would have been won in, so the cost does not depend on the seconds.
+        The seconds are split where buffs run out, so every buff counts for
+        exactly its own seconds, and where an achievement with a reward may be
+        earned, so the reward counts from the second after it, as with ticks.
+
+        Args:
+            seconds: The number of seconds to be produced
+
+        Raises:
+            NotPositiveNumber: An error occurred if the seconds are less than zero
+        """
+
+        if seconds < 0:
+            raise NotPositiveNumber("The seconds must not be negative!")
+
+        while self.achievements is not None:
+            step = self.achievements.horizon(self)
+            if step >= seconds:
+                break
+            self._advance(step)
+            seconds -= step
+
+        self._advance(seconds)
+
+    def _advance(self, seconds: int) -> None:
+        if self.buffs is not None:
+            end = self.age + seconds
+            for deadline, effect in self.buffs.advance(end):
+                self._produce_for(deadline - self.age)
+                self._expire(effect)
+            if not self.buffs:
+                self.buffs = None
+            seconds = end - self.age
+
+        self._produce_for(seconds)
+
+    def _produce_for(self, seconds: int) -> None:
+        if seconds == 0:
+            return
+
+        produced = [amount * seconds for amount in self.rate.counts]
+
+        bonus = self.production.roll_bonuses(self.factories, seconds, self.rng)
+        for cookie, amount in bonus.items():
+            produced[cookie.ordinal] += amount
+
+        self.produce(produced, seconds)
+
+    def produce(self, produced: list[int], seconds: int = 0) -> None:
+        """Add the cookies produced by the factories, indexed by the cookies' ordinal
+
+        Args:
+            produced: The produced amount of every cookie
+            seconds: The number of seconds they were produced in, the player's age grows by them
+        """
+
+        cookies = self.cookies.counts
+        for ordinal, amount in enumerate(produced):
+            cookies[ordinal] += amount
+        self.age += seconds
+
+        # The seconds are only needed to replay when the buffs run out
+        if any(produced) or self.buffs is not None:
+            self._record("produce", produced, seconds)
 
     @staticmethod
     def get_next_factory_price(initial_quantity: int, base_price: int) -> int:
@@ -65,16 +466,43 @@ class Player:
 
         Returns:
             The price of the next factory
+        """
 
-        Raises:
-            TooMuchCookie: An error occurred during the calculation, when the number is so large that the program cannot able to handle
+        return price_table(base_price).unit_price(initial_quantity)
+
+    @staticmethod
+    def get_factories_price(
+        initial_quantity: int, quantity: int, base_price: int
+    ) -> int:
+        """Calculate the total price of the given quantity of factory, each of them rounded as the next factory price
+
+        Args:
+            initial_quantity: The number of factories the player owns before the first one
+            quantity: The number of factories to be priced
+            base_price: The base price of the factory
+
+        Returns:
+            The total price of the factories
         """
 
-        try:
-            return round(base_price * (1.15**initial_quantity))
-        except OverflowError as error:
-            raise TooMuchCookie("Too much!") from error
+        return price_table(base_price).total(initial_quantity, quantity)
+
+    def max_affordable(self, factory: Factory) -> int:
+        """Calculate the largest quantity of the factory that the player can buy
 
+        Args:
+            factory: The factory the player wants to buy
+
+        Returns:
+            The largest quantity that the player's cookies are enough for
+        """
+
+        self.settle()
+        return price_table(factory.base_price).max_quantity(
+            self.factories[factory], self.cookies[factory.type_of_currency]
+        )
+
+    @timed("player.buy_factory")
     def buy_factory(self, factory: Factory, quantity: int) -> int:
         """Add the factory to the player's factories and subtract its price from the player's cookies
 
@@ -90,27 +518,23 @@ class Player:
             NotEnoughCookie: An error occurred when the player didn't have enough cookies to buy the factories
         """
 
-        if quantity < 1:
-            raise NotPositiveNumber("The quantity must be a positive number!")
+        self.settle()
 
-        total_price = 0
-        for q in range(quantity):
-            initial_quantity = self.factories[factory] + q
-            total_price += Player.get_next_factory_price(
-                initial_quantity, factory.base_price
-            )
-
-        if total_price > self.cookies[factory.type_of_currency]:
-            message = f"You don't have enough {factory.type_of_currency}!"
-            message += f"\nIt costs {total_price} {factory.type_of_currency}"
-
-            raise NotEnoughCookie(message)
+        total_price = _factory_purchase(
+            factory,
+            self.factories[factory],
+            self.cookies[factory.type_of_currency],
+            quantity,
+        )
 
         self.cookies[factory.type_of_currency] -= total_price
         self.factories[factory] += quantity
+        self.rate.update(self.production.rate(factory, quantity))
+        self._record("buy_factory", factory.value, quantity)
 
         return total_price
 
+    @timed("player.sell_factory")
     def sell_factory(self, factory: Factory, quantity: int) -> int:
         """Remove the factory from the player's factories and add its price to the player's cookies
 
@@ -126,24 +550,18 @@ class Player:
             NotEnoughFactory: An error occurred when the player didn't have enough factories that the player want to sell
         """
 
-        if quantity < 1:
-            raise NotPositiveNumber("The quantity must be a positive number!")
+        self.settle()
 
-        if self.factories[factory] - quantity < 0:
-            raise NotEnoughFactory("You can't sell more than you have!")
-
-        total_price = 0
-        for q in range(quantity):
-            initial_quantity = self.factories[factory] - quantity + q
-            total_price += Player.get_next_factory_price(
-                initial_quantity, factory.base_price
-            )
+        total_price = _factory_sale(factory, self.factories[factory], quantity)
 
         self.cookies[factory.type_of_currency] += total_price
         self.factories[factory] -= quantity
+        self.rate.subtract(self.production.rate(factory, quantity))
+        self._record("sell_factory", factory.value, quantity)
 
         return total_price
 
+    @timed("player.buy_effect")
     def buy_effect(self, effect: PurchasableEffect) -> int:
         """Add the effect to the player's effects and subtract its price from the player's cookies
 
@@ -158,18 +576,99 @@ class Player:
             NotEnoughCookie: An error occurred when the player didn't have enough cookies to buy the effect
         """
 
-        if effect.function in self.effects:
-            raise EffectAlreadyExist("You already bought this!")
+        self.settle()
 
-        price = effect.base_price
-
-        if price > self.cookies[effect.type_of_currency]:
-            message = f"You don't have enough {effect.type_of_currency}!"
-            message += f"\nIt costs {price} {effect.type_of_currency}"
-
-            raise NotEnoughCookie(message)
+        price = _effect_purchase(
+            effect, self.effects, self.cookies[effect.type_of_currency]
+        )
 
         self.cookies[effect.type_of_currency] -= price
-        self.effects.add(effect.function)
+        if effect.duration:
+            self._buff(effect.function, effect.duration)
+        else:
+            self.effects.add(effect.function)
+        self.refresh()
+        self._record("buy_effect", effect.value)
 
         return price
+
+    @timed("player.apply_orders")
+    def apply_orders(self, orders: Iterable[Order]) -> Receipt:
+        """Apply every order at once, or none of them if any of them cannot be applied
+
+        The orders are checked one after the other on a copy of the player's
+        state, so a sell can pay for a later buy, then the result is stored in
+        one step under the player's lock.
+
+        Args:
+            orders: The orders in the order they should be applied
+
+        Returns:
+            The receipt of the applied orders
+
+        Raises:
+            NotPositiveNumber: An error occurred if the quantity of an order is less than one
+            NotEnoughCookie: An error occurred when the player didn't have enough cookies for an order
+            NotEnoughFactory: An error occurred when the player didn't have enough factories to sell
+            EffectAlreadyExist: An error occurred if an effect is already exists in the player's effects
+            InvalidOrder: An error occurred if an order is neither buying or selling a factory nor buying an effect
+        """
+
+        orders = tuple(orders)
+        prices = []
+
+        with self.lock:
+            self.settle()
+            cookies = list(self.cookies.counts)
+            factories = list(self.factories.counts)
+            effects = EffectSet(self.effects)
+
+            for order in orders:
+                match order:
+                    case Order("buy", Factory() as factory, quantity):
+                        currency = factory.type_of_currency.ordinal
+                        owned = factories[factory.ordinal]
+                        price = _factory_purchase(
+                            factory, owned, cookies[currency], quantity
+                        )
+                        factories[factory.ordinal] += quantity
+                    case Order("sell", Factory() as factory, quantity):
+                        currency = factory.type_of_currency.ordinal
+                        owned = factories[factory.ordinal]
+                        price = -_factory_sale(factory, owned, quantity)
+                        factories[factory.ordinal] -= quantity
+                    case Order("buy", PurchasableEffect() as effect, 1):
+                        currency = effect.type_of_currency.ordinal
+                        price = _effect_purchase(effect, effects, cookies[currency])
+                        effects.add(effect.function)
+                    case _:
+                        raise InvalidOrder(f"Invalid order: {order}")
+
+                cookies[currency] -= price
+                prices.append(price)
+
+            # Assign only the changed counts, so a spent balance stays present
+            spent = EnumCounter(Cookie)
+            for before, after, cookie in zip(self.cookies.counts, cookies, Cookie):
+                if after != before:
+                    spent[cookie] = before - after
+                    self.cookies[cookie] = after
+            for before, after, factory in zip(
+                self.factories.counts, factories, Factory
+            ):
+                if after != before:
+                    self.factories[factory] = after
+            self.effects = effects
+            for order in orders:
+                if isinstance(order.item, PurchasableEffect) and order.item.duration:
+                    self._buff(order.item.function, order.item.duration)
+            self.refresh()
+
+            for order in orders:
+                if isinstance(order.item, Factory):
+                    operation = f"{order.action}_factory"
+                    self._record(operation, order.item.value, order.quantity)
+                else:
+                    self._record("buy_effect", order.item.value)
+
+        return Receipt(orders, tuple(prices), MappingProxyType(dict(spent.items())))
@@ -0,0 +1,148 @@
+# MIT License
+#
+# Copyright (c) 2023 Kovács József Miklós
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from typing import Iterable
+
+import numpy as np
+
+from cookie import Cookie
+from factory import Factory
+from effect import EFFECT_RULES, EFFECTS, Bonus, EffectSet, compile_effects
+from player import Player, NotPositiveNumber
+
+FACTORIES: tuple[Factory, ...] = tuple(Factory)
+COOKIES: tuple[Cookie, ...] = tuple(Cookie)
+
+
+class Population:
+    """The factories, cookies and effects of many players as arrays, produced all at once
+
+    Row p of every array belongs to the p-th player, the columns follow the order
+    of FACTORIES, COOKIES and EFFECTS. The cookies are 64-bit integers, unlike the
+    unbounded integers of a Player.
+    Buffs are copied as plain effects, they do not run out while their
+    players are produced here.
+    """
+
+    def __init__(self, size: int, rng: np.random.Generator | None = None) -> None:
+        self.factories = np.zeros((size, len(FACTORIES)), dtype=np.int64)
+        self.cookies = np.zeros((size, len(COOKIES)), dtype=np.int64)
+        self.effects = np.zeros((size, len(EFFECTS)), dtype=bool)
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+        # The cookies every factory produces, which are the ones a bonus adds to
+        self._produces = np.array(
+            [[cookie in f.production_volume for cookie in COOKIES] for f in FACTORIES]
+        )
+        self._bonuses = [
+            (EFFECTS.index(effect), rule)
+            for effect, rules in EFFECT_RULES.items()
+            for rule in rules
+            if isinstance(rule, Bonus)
+        ]
+        self._volumes: dict[bytes, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.cookies)
+
+    @classmethod
+    def from_players(
+        cls, players: Iterable[Player], rng: np.random.Generator | None = None
+    ) -> "Population":
+        """Copy the state of the players into a new population"""
+
+        players = list(players)
+        population = cls(len(players), rng)
+        for row, player in enumerate(players):
+            population.load(row, player)
+        return population
+
+    def load(self, row: int, player: Player) -> None:
+        """Copy the state of the player into the row"""
+
+        self.factories[row] = player.factories.counts
+        self.cookies[row] = player.cookies.counts
+        self.effects[row] = [effect in player.effects for effect in EFFECTS]
+
+    def store(self, row: int, player: Player) -> None:
+        """Copy the state of the row back into the player"""
+
+        player.cookies.counts = [int(n) for n in self.cookies[row]]
+        player.factories.counts = [int(n) for n in self.factories[row]]
+        player.effects = EffectSet(
+            e for e, has in zip(EFFECTS, self.effects[row]) if has
+        )
+        player.refresh()
+
+    def _table(self, row: np.ndarray) -> np.ndarray:
+        """Returns the per unit production of every factory under the effects of the row"""
+
+        code = row.tobytes()
+        try:
+            return self._volumes[code]
+        except KeyError:
+            effects = frozenset(e for e, has in zip(EFFECTS, row) if has)
+            volumes = compile_effects(effects).volumes
+            table = np.array(
+                [[volumes[f].get(cookie, 0) for cookie in COOKIES] for f in FACTORIES],
+                dtype=np.int64,
+            )
+            return self._volumes.setdefault(code, table)
+
+    def rates(self) -> np.ndarray:
+        """Returns the cookies surely produced by every player in one second"""
+
+        rows, inverse = np.unique(self.effects, axis=0, return_inverse=True)
+        tables = np.stack([self._table(row) for row in rows])
+        return np.einsum("pf,pfc->pc", self.factories, tables[inverse.ravel()])
+
+    def roll_bonuses(self, seconds: int = 1) -> np.ndarray:
+        """Returns the bonus cookies won by every player in the given seconds"""
+
+        cookies = np.zeros_like(self.cookies)
+        for column, rule in self._bonuses:
+            success, failure = rule.weights
+            probability = success / (success + failure)
+            shape = self.factories.shape
+            if seconds == 1:
+                wins = self.rng.random(shape) < probability
+            else:
+                wins = self.rng.binomial(seconds, probability, shape)
+
+            won = wins * self.factories * self.effects[:, column, None]
+            cookies += rule.amount * (won @ self._produces.astype(np.int64))
+        return cookies
+
+    def tick(self) -> None:
+        """Produce the cookies of one second for the whole population"""
+
+        self.advance(1)
+
+    def advance(self, seconds: int) -> None:
+        """Produce the cookies of the given number of seconds for the whole population"""
+
+        if seconds < 0:
+            raise NotPositiveNumber("The seconds must not be negative!")
+        if seconds == 0 or not len(self):
+            return
+
+        self.cookies += self.rates() * seconds + self.roll_bonuses(seconds)
@@ -0,0 +1,150 @@
+# MIT License
+#
+# Copyright (c) 2023 Kovács József Miklós
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import math
+import threading
+
+from bisect import bisect_right
+
+# The price of every further factory grows by 15% (23 / 20), calculated exactly
+GROWTH_NUMERATOR = 23
+GROWTH_DENOMINATOR = 20
+
+
+def _round(integer: int, remainder: int, denominator: int) -> int:
+    """Returns integer + remainder / denominator rounded half to even, like the builtin round"""
+
+    twice = 2 * remainder
+    if twice > denominator or (twice == denominator and integer % 2):
+        return integer + 1
+    return integer
+
+
+class PriceTable:
+    """Exact unit prices and their running totals for one base price, grown on demand
+
+    The price of any quantity is the difference of two running totals, so it
+    costs the same no matter how many factories are bought or sold at once,
+    while every unit is still rounded on its own.
+    """
+
+    def __init__(self, base_price: int) -> None:
+        self.base_price = base_price
+        self._totals: list[int] = [0]
+        # The exact price of the next factory is integer + remainder / denominator,
+        # where the denominator is the matching power of GROWTH_DENOMINATOR
+        self._integer = base_price
+        self._remainder = 0
+        self._denominator = 1
+        self._lock = threading.Lock()
+
+    def _grow(self, size: int) -> None:
+        """Extend the running totals so that the first size totals are known"""
+
+        if size <= len(self._totals):
+            return
+
+        with self._lock:
+            total = self._totals[-1]
+            integer, remainder = self._integer, self._remainder
+            denominator = self._denominator
+            for _ in range(size - len(self._totals)):
+                total += _round(integer, remainder, denominator)
+                self._totals.append(total)
+
+                # Multiply by the growth while keeping the integer part exact
+                integer, carry = divmod(integer * GROWTH_NUMERATOR, GROWTH_DENOMINATOR)
+                carry = carry * denominator + remainder * GROWTH_NUMERATOR
+                denominator *= GROWTH_DENOMINATOR
+                extra, remainder = divmod(carry, denominator)
+                integer += extra
+            self._integer, self._remainder = integer, remainder
+            self._denominator = denominator
+
+    def unit_price(self, initial_quantity: int) -> int:
+        """Returns the price of one factory when initial_quantity of them are already owned"""
+
+        totals = self._totals
+        if initial_quantity + 1 < len(totals):
+            return totals[initial_quantity + 1] - totals[initial_quantity]
+
+        # Growing the running totals up to here would cost quadratic time, so a
+        # single price is calculated on its own
+        denominator = GROWTH_DENOMINATOR**initial_quantity
+        integer, remainder = divmod(
+            self.base_price * GROWTH_NUMERATOR**initial_quantity, denominator
+        )
+        return _round(integer, remainder, denominator)
+
+    def total(self, initial_quantity: int, quantity: int) -> int:
+        """Returns the price of quantity factories starting from initial_quantity
+
+        Bulk prices grow the running totals, which costs quadratic time in the
+        largest quantity ever reached, once per base price.
+        """
+
+        if quantity == 1:
+            return self.unit_price(initial_quantity)
+        self._grow(initial_quantity + quantity + 1)
+        totals = self._totals
+        return totals[initial_quantity + quantity] - totals[initial_quantity]
+
+    def max_quantity(self, initial_quantity: int, budget: int) -> int:
+        """Returns the largest quantity that can be bought for the budget"""
+
+        if budget < 1:
+            return 0
+
+        # Closed form of the geometric series estimates the answer, so the
+        # running totals are usually grown only once before the binary search
+        first = self.unit_price(initial_quantity)
+        self._grow(initial_quantity + 1)
+        limit = self._totals[initial_quantity] + budget
+        growth = GROWTH_NUMERATOR - GROWTH_DENOMINATOR
+        estimate = math.log(budget * growth + first * GROWTH_DENOMINATOR) - math.log(
+            first * GROWTH_DENOMINATOR
+        )
+        size = (
+            initial_quantity
+            + int(estimate / math.log(GROWTH_NUMERATOR / GROWTH_DENOMINATOR))
+            + 3
+        )
+
+        while self._totals[-1] <= limit:
+            self._grow(size)
+            size += size - initial_quantity
+
+        return bisect_right(self._totals, limit) - 1 - initial_quantity
+
+
+_tables: dict[int, PriceTable] = {}
+_tables_lock = threading.Lock()
+
+
+def price_table(base_price: int) -> PriceTable:
+    """Returns the shared price table belonging to the base price"""
+
+    try:
+        return _tables[base_price]
+    except KeyError:
+        with _tables_lock:
+            return _tables.setdefault(base_price, PriceTable(base_price))
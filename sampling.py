@@ -0,0 +1,107 @@
+# MIT License
+#
+# Copyright (c) 2023 Kovács József Miklós
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import math
+import random as _random
+
+from typing import Callable
+
+
+def geometric(probability: float, random: Callable[[], float] = _random.random) -> int:
+    """Draw the number of trials up to and including the first success
+
+    Args:
+        probability: The chance of success of one trial, more than zero
+        random: The source of uniform numbers in [0, 1)
+
+    Returns:
+        The number of trials, at least one
+    """
+
+    if probability >= 1.0:
+        return 1
+    return math.floor(math.log(1.0 - random()) / math.log(1.0 - probability)) + 1
+
+
+def binomial(
+    trials: int, probability: float, random: Callable[[], float] = _random.random
+) -> int:
+    """Draw the number of successes out of the trials, each with the same probability
+
+    Small expectations count geometric gaps between the successes, larger ones
+    use Hörmann's transformed rejection with squeeze (BTRS), so the cost does
+    not depend on the number of trials.
+
+    Args:
+        trials: The number of independent trials
+        probability: The chance of success of one trial
+        random: The source of uniform numbers in [0, 1)
+
+    Returns:
+        The number of successful trials
+    """
+
+    if trials < 0:
+        raise ValueError("The number of trials must not be negative")
+    if probability <= 0.0 or trials == 0:
+        return 0
+    if probability >= 1.0:
+        return trials
+    if probability > 0.5:
+        return trials - binomial(trials, 1.0 - probability, random)
+
+    if trials * probability < 10.0:
+        successes = position = 0
+        scale = math.log(1.0 - probability)
+        while True:
+            position += math.floor(math.log(1.0 - random()) / scale) + 1
+            if position > trials:
+                return successes
+            successes += 1
+
+    spq = math.sqrt(trials * probability * (1.0 - probability))
+    b = 1.15 + 2.53 * spq
+    a = -0.0873 + 0.0248 * b + 0.01 * probability
+    c = trials * probability + 0.5
+    v_r = 0.92 - 4.2 / b
+
+    alpha = (2.83 + 5.1 / b) * spq
+    lpq = math.log(probability / (1.0 - probability))
+    mode = math.floor((trials + 1) * probability)
+    h = math.lgamma(mode + 1) + math.lgamma(trials - mode + 1)
+
+    while True:
+        u = random() - 0.5
+        us = 0.5 - abs(u)
+        k = math.floor((2.0 * a / us + b) * u + c)
+        if k < 0 or k > trials:
+            continue
+
+        v = 1.0 - random()
+        if us >= 0.07 and v <= v_r:
+            return k
+
+        v *= alpha / (a / (us * us) + b)
+        if math.log(v) <= (
+            h - math.lgamma(k + 1) - math.lgamma(trials - k + 1) + (k - mode) * lpq
+        ):
+            return k
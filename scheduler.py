@@ -0,0 +1,210 @@
+# MIT License
+#
+# Copyright (c) 2023 Kovács József Miklós
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import math
+import time
+import heapq
+import asyncio
+import itertools
+import threading
+
+from typing import Callable
+
+import metrics
+
+from player import Player
+
+
+class TickScheduler:
+    """Produces the cookies of any number of players every period against a monotonic clock
+
+    Every player is due at fixed multiples of the period from when it was added,
+    so the ticks do not drift however long they take. Ticks that were missed are
+    caught up at once with Player.advance, holding only the player's lock. The
+    scheduler runs either on its own thread (start/stop) or as a coroutine on an
+    asyncio loop (run), and can be driven by hand with run_pending, e.g. against
+    a simulated clock.
+    """
+
+    def __init__(
+        self,
+        period: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.period = period
+        self.clock = clock
+
+        self._queue: list[tuple[float, int, Player]] = []
+        # The sequence number of the only valid queue item of every player
+        self._players: dict[Player, int] = {}
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self._running = False
+        self._paused_at: float | None = None
+        # Called after every run that produced for some players, e.g. to
+        # update what depends on all of them at once
+        self.after_ticks: list[Callable[[], object]] = []
+        self._durations = metrics.histogram("scheduler.tick")
+        self._drifts = metrics.histogram("scheduler.drift")
+
+    def add(self, player: Player) -> None:
+        """Schedule the player, its first tick is due immediately"""
+
+        with self._condition:
+            sequence = next(self._sequence)
+            self._players[player] = sequence
+            heapq.heappush(self._queue, (self.clock(), sequence, player))
+            self._condition.notify()
+
+    def remove(self, player: Player) -> None:
+        """Stop producing the player's cookies"""
+
+        with self._condition:
+            self._players.pop(player, None)
+
+    def _is_valid(self, due: float, sequence: int, player: Player) -> bool:
+        return self._players.get(player) == sequence
+
+    def next_due(self) -> float | None:
+        """Returns when the next tick is due, or None if there is nothing to do"""
+
+        with self._condition:
+            while self._queue and not self._is_valid(*self._queue[0]):
+                heapq.heappop(self._queue)
+            if self._paused_at is not None or not self._queue:
+                return None
+            return self._queue[0][0]
+
+    def run_pending(self) -> int:
+        """Run every tick that is due, catching up on the missed ones
+
+        When the metrics are enabled, the duration of every run with something
+        due and how late every player was run are recorded.
+
+        Returns:
+            The number of players that produced cookies
+        """
+
+        started = time.perf_counter_ns() if metrics.enabled else 0
+        now = self.clock()
+        due_players = []
+
+        with self._condition:
+            if self._paused_at is not None:
+                return 0
+            while self._queue and self._queue[0][0] <= now:
+                item = heapq.heappop(self._queue)
+                if self._is_valid(*item):
+                    due_players.append(item)
+
+        for due, sequence, player in due_players:
+            if started:
+                self._drifts.record(int((now - due) * 1e9))
+            seconds = math.floor((now - due) / self.period) + 1
+            with player.lock:
+                player.advance(seconds)
+
+            with self._condition:
+                if self._is_valid(due, sequence, player):
+                    sequence = next(self._sequence)
+                    self._players[player] = sequence
+                    item = (due + seconds * self.period, sequence, player)
+                    heapq.heappush(self._queue, item)
+
+        if due_players:
+            for callback in self.after_ticks:
+                callback()
+        if started and due_players:
+            self._durations.record(time.perf_counter_ns() - started)
+        return len(due_players)
+
+    def pause(self) -> None:
+        """Freeze the production, the paused time will not be caught up"""
+
+        with self._condition:
+            if self._paused_at is None:
+                self._paused_at = self.clock()
+
+    def resume(self) -> None:
+        """Continue the production where it was paused"""
+
+        with self._condition:
+            if self._paused_at is None:
+                return
+
+            paused_for = self.clock() - self._paused_at
+            self._paused_at = None
+            self._queue = [
+                (due + paused_for, sequence, player)
+                for due, sequence, player in self._queue
+            ]
+            heapq.heapify(self._queue)
+            self._condition.notify()
+
+    def _wait(self) -> None:
+        """Wait on the thread until the next tick is due or the scheduler changes"""
+
+        with self._condition:
+            due = self.next_due()
+            if self._running:
+                timeout = None if due is None else max(due - self.clock(), 0.0)
+                self._condition.wait(timeout)
+
+    def _run_thread(self) -> None:
+        while self._running:
+            self.run_pending()
+            self._wait()
+
+    def start(self) -> None:
+        """Start producing on a daemon thread"""
+
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+
+        self._thread = threading.Thread(
+            target=self._run_thread, name="tick-scheduler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the thread or the coroutine, the players stay scheduled"""
+
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+            self._thread = None
+
+    async def run(self) -> None:
+        """Produce on the running asyncio loop until stopped"""
+
+        self._running = True
+        while self._running:
+            self.run_pending()
+            due = self.next_due()
+            delay = self.period if due is None else due - self.clock()
+            await asyncio.sleep(max(delay, 0.0))
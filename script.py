@@ -0,0 +1,151 @@
+# MIT License
+#
+# Copyright (c) 2023 Kovács József Miklós
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import json
+import math
+
+from typing import Any, Iterable, Iterator, TextIO
+
+import commands
+
+from player import Player, NotPositiveNumber
+
+
+class SimulatedClock:
+    """A clock for lazily settled players that only moves when it is told to"""
+
+    __slots__ = ("now",)
+
+    def __init__(self, now: float = 0.0) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        """Move the clock forward
+
+        Raises:
+            NotPositiveNumber: An error occurred if the seconds are less than zero
+        """
+
+        if seconds < 0:
+            raise NotPositiveNumber("The time cannot go backwards!")
+        self.now += seconds
+
+
+def _move(clock: SimulatedClock, seconds: str, since: float) -> list[str]:
+    """Move the clock to the seconds since the given time, returns the error if it cannot"""
+
+    try:
+        target = float(seconds) + since
+        if not math.isfinite(target):
+            raise ValueError(seconds)
+        clock.advance(target - clock.now)
+    except ValueError:
+        return [f"'{seconds}' is not a number of seconds"]
+    except NotPositiveNumber as error:
+        return [str(error)]
+    return []
+
+
+def run(
+    player: Player,
+    lines: Iterable[str],
+    clock: SimulatedClock,
+    step: float = 0.0,
+) -> Iterator[dict[str, Any]]:
+    """Run a stream of commands against the player on simulated time
+
+    Every line is a command of the menu grammar (see commands.execute), and
+    the clock moves forward by the step after it. Besides those, 'wait
+    SECONDS' moves the clock forward, '@SECONDS command' runs the command at
+    that time of the clock, and 'quit' or 'exit' ends the stream. Empty lines
+    and lines starting with '#' are skipped.
+
+    Args:
+        player: The player, whose clock must be the simulated clock
+        lines: The commands
+        clock: The simulated clock
+        step: The seconds passing between two commands
+
+    Returns:
+        The result of every command: its line number, the time, the command
+        and the lines of its answer
+    """
+
+    for number, line in enumerate(lines, 1):
+        command = line.strip()
+        if not command or command.startswith("#"):
+            continue
+
+        match command.split(maxsplit=1):
+            case ["quit" | "exit"]:
+                return
+            case ["wait", seconds]:
+                answer = _move(clock, seconds, clock.now)
+            case [timestamp, rest] if timestamp.startswith("@"):
+                answer = _move(clock, timestamp[1:], 0.0)
+                answer = answer or commands.execute(player, rest)
+            case _:
+                answer = commands.execute(player, command)
+
+        yield {"line": number, "time": clock.now, "command": command, "answer": answer}
+        clock.advance(step)
+
+
+def summary(player: Player, clock: SimulatedClock, count: int) -> dict[str, Any]:
+    """Returns the final state of the player after a stream of commands"""
+
+    snapshot = player.snapshot()
+    return {
+        "time": clock.now,
+        "commands": count,
+        "cookies": {cookie.value: n for cookie, n in snapshot.cookies.items()},
+        "factories": {factory.value: n for factory, n in snapshot.factories.items()},
+        "effects": sorted(effect.__name__ for effect in snapshot.effects),
+    }
+
+
+def play(
+    player: Player,
+    source: TextIO,
+    output: TextIO,
+    clock: SimulatedClock,
+    step: float = 0.0,
+) -> int:
+    """Run the commands of the source and write the results as JSON lines
+
+    The last line is the summary of the final state.
+
+    Returns:
+        The number of commands run
+    """
+
+    count = 0
+    for result in run(player, source, clock, step):
+        output.write(json.dumps(result, separators=(",", ":")) + "\n")
+        count += 1
+    output.write(json.dumps(summary(player, clock, count), separators=(",", ":")))
+    output.write("\n")
+    output.flush()
+    return count
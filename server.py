@@ -0,0 +1,132 @@
+# MIT License
+#
+# Copyright (c) 2023 Kovács József Miklós
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import asyncio
+import argparse
+
+import metrics
+import commands
+
+from player import Player
+from scheduler import TickScheduler
+from leaderboard import Leaderboard
+from achievements import track
+
+
+class GameServer:
+    """Serves game sessions over a line-based protocol, all of them on one asyncio loop
+
+    Every connection plays with its own Player. A command is one line of the
+    menu grammar (see commands.execute), its answer is one or more lines
+    followed by an empty line, and 'top' shows the leaderboard of the
+    sessions. The cookies of every session are produced by one shared
+    TickScheduler on its own thread, which also applies the changed scores
+    to the leaderboard after every tick, so that work stays off the loop.
+    """
+
+    def __init__(self, scheduler: TickScheduler | None = None) -> None:
+        self.scheduler = scheduler if scheduler is not None else TickScheduler()
+        self.sessions: set[Player] = set()
+        self.leaderboard = Leaderboard()
+        self.scheduler.after_ticks.append(self.leaderboard.flush)
+
+    def ranking(self, player: Player, count: int = 10) -> list[str]:
+        """Returns the best sessions by cookies and by rate, and the place of the player"""
+
+        lines = []
+        for title, top, rank in (
+            (
+                "cookies",
+                self.leaderboard.top_by_cookies,
+                self.leaderboard.rank_by_cookies,
+            ),
+            ("rate", self.leaderboard.top_by_rate, self.leaderboard.rank_by_rate),
+        ):
+            lines.append(f"~Top by {title}~")
+            for place, (other, score) in enumerate(top(count), 1):
+                you = " (you)" if other is player else ""
+                lines.append(f"\t{place}. {score}{you}")
+            lines.append(f"\tYou are #{rank(player)} of {len(self.leaderboard)}")
+        return lines
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Play one session until the client quits or disconnects"""
+
+        player = Player()
+        track(player)
+        self.sessions.add(player)
+        self.leaderboard.add(player)
+        self.scheduler.add(player)
+        try:
+            while line := await reader.readline():
+                command = line.decode(errors="replace").strip()
+                if command in ("quit", "exit"):
+                    break
+
+                if command == "top":
+                    answer = self.ranking(player)
+                else:
+                    answer = commands.execute(player, command)
+                writer.write(("\n".join(answer) + "\n\n").encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.scheduler.remove(player)
+            self.leaderboard.remove(player)
+            self.sessions.discard(player)
+            writer.close()
+
+    async def serve(
+        self, host: str = "127.0.0.1", port: int = 7777, path: str | None = None
+    ) -> None:
+        """Listen on the TCP port, or on the Unix socket if a path is given, forever"""
+
+        if path is not None:
+            server = await asyncio.start_unix_server(self.handle, path)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+
+        self.scheduler.start()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await asyncio.to_thread(self.scheduler.stop)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cookie-factory server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7777)
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket")
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+
+    metrics.start_from_args(args)
+
+    try:
+        asyncio.run(GameServer().serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
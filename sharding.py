@@ -0,0 +1,265 @@
+# MIT License
+#
+# Copyright (c) 2023 Kovács József Miklós
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import os
+import zlib
+import queue
+import threading
+import multiprocessing
+
+from dataclasses import dataclass
+from multiprocessing.shared_memory import SharedMemory
+
+import commands
+
+from cookie import Cookie
+from factory import Factory
+from player import Player
+from scheduler import TickScheduler
+
+# The shared statistics of a shard: a sequence number, which is odd while the
+# shard writes, the number of players and factories (int64), then the cookies
+# (float64, because they can outgrow 64-bit integers)
+_COUNTS = 2 + len(Factory)
+_SIZE = 8 * (_COUNTS + len(Cookie))
+
+_STOP = None
+
+
+@dataclass(frozen=True)
+class Stats:
+    """The aggregate statistics of the players"""
+
+    players: int
+    factories: dict[Factory, int]
+    cookies: dict[Cookie, float]
+
+
+class _SharedStats:
+    """The statistics of one shard in shared memory, written by the shard and read by anyone
+
+    The shard keeps its totals as running aggregates, adjusted by what every
+    command changed, and only counts them again from all of its players after
+    the ticks, at most once a period. Publishing writes just the totals.
+    """
+
+    def __init__(self, name: str | None = None) -> None:
+        if name is None:
+            self.memory = SharedMemory(create=True, size=_SIZE)
+        else:
+            self.memory = SharedMemory(name=name)
+        self.counts = self.memory.buf[: 8 * _COUNTS].cast("q")
+        self.cookies = self.memory.buf[8 * _COUNTS : _SIZE].cast("d")
+        self.factory_totals = [0] * len(Factory)
+        self.cookie_totals = [0] * len(Cookie)
+
+    def recount(self, players: dict[str, Player]) -> None:
+        """Count the totals again from every player"""
+
+        factories = [0] * len(Factory)
+        cookies = [0] * len(Cookie)
+        for player in players.values():
+            with player.lock:
+                for ordinal, count in enumerate(player.factories.counts):
+                    factories[ordinal] += count
+                for ordinal, count in enumerate(player.cookies.counts):
+                    cookies[ordinal] += count
+        self.factory_totals = factories
+        self.cookie_totals = cookies
+
+    def adjust(self, player: Player, factories: list[int], cookies: list[int]) -> None:
+        """Add what changed since the player had the given factories and cookies"""
+
+        with player.lock:
+            for ordinal, (before, after) in enumerate(
+                zip(factories, player.factories.counts)
+            ):
+                self.factory_totals[ordinal] += after - before
+            for ordinal, (before, after) in enumerate(
+                zip(cookies, player.cookies.counts)
+            ):
+                self.cookie_totals[ordinal] += after - before
+
+    def write(self, players: int) -> None:
+        """Publish the totals, the sequence number is odd while they are written"""
+
+        self.counts[0] += 1
+        self.counts[1] = players
+        for ordinal, count in enumerate(self.factory_totals):
+            self.counts[2 + ordinal] = count
+        for ordinal, count in enumerate(self.cookie_totals):
+            self.cookies[ordinal] = float(count)
+        self.counts[0] += 1
+
+    def read(self) -> tuple[int, list[int], list[float]]:
+        while True:
+            sequence = self.counts[0]
+            if sequence % 2 == 0:
+                counts = self.counts.tolist()
+                cookies = self.cookies.tolist()
+                if self.counts[0] == sequence:
+                    return counts[1], counts[2:], cookies
+
+    def close(self) -> None:
+        self.counts.release()
+        self.cookies.release()
+        self.memory.close()
+
+
+def _work(
+    name: str,
+    period: float,
+    inbox: multiprocessing.Queue,
+    outbox: multiprocessing.Queue,
+) -> None:
+    """The loop of a shard process: run the commands and the ticks of its players"""
+
+    stats = _SharedStats(name)
+    scheduler = TickScheduler(period=period)
+    players: dict[str, Player] = {}
+    recounted_at = scheduler.clock()
+
+    try:
+        while True:
+            due = scheduler.next_due()
+            timeout = None if due is None else max(due - scheduler.clock(), 0.0)
+            try:
+                message = inbox.get(timeout=timeout)
+            except queue.Empty:
+                message = ()
+
+            if message is _STOP:
+                break
+            if message:
+                player_id, line = message
+                if player_id not in players:
+                    players[player_id] = Player()
+                    scheduler.add(players[player_id])
+                player = players[player_id]
+                with player.lock:
+                    factories = list(player.factories.counts)
+                    cookies = list(player.cookies.counts)
+                outbox.put(commands.execute(player, line))
+                stats.adjust(player, factories, cookies)
+
+            # The production of the ticks touched every player anyway
+            recount = False
+            if scheduler.run_pending():
+                recount = scheduler.clock() - recounted_at >= period
+            if recount:
+                stats.recount(players)
+                recounted_at = scheduler.clock()
+            if recount or message:
+                stats.write(len(players))
+    finally:
+        stats.close()
+
+
+class ShardedRuntime:
+    """Spreads the players over worker processes by the hash of their id
+
+    Every shard ticks its own players with its own TickScheduler. The shards
+    publish the aggregate statistics of their players into shared memory, so
+    stats() reads them without any message to the processes.
+    """
+
+    def __init__(self, shards: int | None = None, period: float = 1.0) -> None:
+        self.shards = shards or os.cpu_count() or 1
+        self.period = period
+        self._stats: list[_SharedStats] = []
+        self._inboxes: list[multiprocessing.Queue] = []
+        self._outboxes: list[multiprocessing.Queue] = []
+        self._locks = [threading.Lock() for _ in range(self.shards)]
+        self._processes: list[multiprocessing.Process] = []
+
+    def __enter__(self) -> "ShardedRuntime":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def shard_of(self, player_id: str) -> int:
+        """Returns the index of the shard the player belongs to"""
+
+        return zlib.crc32(player_id.encode()) % self.shards
+
+    def start(self) -> None:
+        """Start the worker processes"""
+
+        for _ in range(self.shards):
+            stats = _SharedStats()
+            inbox: multiprocessing.Queue = multiprocessing.Queue()
+            outbox: multiprocessing.Queue = multiprocessing.Queue()
+            process = multiprocessing.Process(
+                target=_work,
+                args=(stats.memory.name, self.period, inbox, outbox),
+                daemon=True,
+            )
+            process.start()
+
+            self._stats.append(stats)
+            self._inboxes.append(inbox)
+            self._outboxes.append(outbox)
+            self._processes.append(process)
+
+    def stop(self) -> None:
+        """Stop the worker processes and free the shared memory"""
+
+        for inbox in self._inboxes:
+            inbox.put(_STOP)
+        for process in self._processes:
+            process.join()
+        for stats in self._stats:
+            stats.close()
+            stats.memory.unlink()
+
+        self._stats.clear()
+        self._inboxes.clear()
+        self._outboxes.clear()
+        self._processes.clear()
+
+    def execute(self, player_id: str, line: str) -> list[str]:
+        """Run a command of the player on its shard, see commands.execute"""
+
+        shard = self.shard_of(player_id)
+        with self._locks[shard]:
+            self._inboxes[shard].put((player_id, line))
+            return self._outboxes[shard].get()
+
+    def stats(self) -> Stats:
+        """Returns the aggregate statistics of every shard, read from shared memory"""
+
+        players = 0
+        factories = [0] * len(Factory)
+        cookies = [0.0] * len(Cookie)
+        for shard in self._stats:
+            shard_players, shard_factories, shard_cookies = shard.read()
+            players += shard_players
+            factories = [a + b for a, b in zip(factories, shard_factories)]
+            cookies = [a + b for a, b in zip(cookies, shard_cookies)]
+
+        return Stats(
+            players,
+            dict(zip(Factory, factories)),
+            dict(zip(Cookie, cookies)),
+        )
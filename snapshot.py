@@ -0,0 +1,294 @@
+# MIT License
+#
+# Copyright (c) 2023 Kovács József Miklós
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import os
+import mmap
+import struct
+
+from typing import Callable, Iterable, Iterator
+
+from cookie import Cookie
+from factory import Factory
+from effect import EFFECT_ORDINALS, EFFECTS
+from player import Player
+
+MAGIC = b"COOKIES\0"
+VERSION = 2
+# The versions that can still be read, the first one has no buffs
+_READABLE = (1, 2)
+
+# magic, version, number of factories, cookies and effects
+_HEADER = struct.Struct("<8sHHHH")
+_COUNT = struct.Struct("<Q")
+# index of the player, position of the effect, seconds left
+_BUFF = struct.Struct("<QIQ")
+_COOKIE_SIZE = 16
+_FACTORY_SIZE = 8
+
+
+def _effects_size(effects: int) -> int:
+    """The effect mask takes 64 bits per 64 effects, but at least 64 bits"""
+
+    return max(-(-effects // 64), 1) * 8
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _names() -> tuple[list[str], list[str], list[str]]:
+    return (
+        [factory.value for factory in Factory],
+        [cookie.value for cookie in Cookie],
+        [effect.__name__ for effect in EFFECTS],
+    )
+
+
+def save(path: str, players: Iterable[Player]) -> int:
+    """Save the players into a snapshot file, replacing it atomically
+
+    The header lists the names of the factories, cookies and effects in the
+    order of their ordinal, which is the order of the fixed-width fields of
+    every record, so a snapshot stays readable when the catalog changes.
+    The records are followed by the seconds left of the players' buffs,
+    sorted by the index of the player.
+
+    Args:
+        path: The snapshot file
+        players: The players to be saved
+
+    Returns:
+        The number of saved players
+
+    Raises:
+        SnapshotError: An error occurred if a player has more cookies than the format can hold
+    """
+
+    factories, cookies, effects = _names()
+    header = bytearray(
+        _HEADER.pack(MAGIC, VERSION, len(factories), len(cookies), len(effects))
+    )
+    for name in factories + cookies + effects:
+        encoded = name.encode()
+        header += bytes([len(encoded)]) + encoded
+    header += bytes(-(len(header) + _COUNT.size) % 8)
+
+    count = 0
+    buffs = []
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as file:
+        file.write(header)
+        file.write(_COUNT.pack(0))
+        for player in players:
+            record, remaining = _encode(player)
+            file.write(record)
+            buffs.extend(_BUFF.pack(count, *buff) for buff in remaining)
+            count += 1
+
+        file.write(_COUNT.pack(len(buffs)))
+        file.write(b"".join(buffs))
+        file.seek(len(header))
+        file.write(_COUNT.pack(count))
+        file.flush()
+        os.fsync(file.fileno())
+
+    os.replace(temporary, path)
+    return count
+
+
+def _encode(player: Player) -> tuple[bytes, list[tuple[int, int]]]:
+    with player.lock:
+        player.settle()
+        cookies = list(player.cookies.counts)
+        factories = list(player.factories.counts)
+        mask = player.effects.mask
+        buffs = sorted(
+            (EFFECT_ORDINALS[effect], player.remaining(effect))
+            for effect in player.buffs or ()
+        )
+
+    record = bytearray()
+    try:
+        for count in cookies:
+            record += count.to_bytes(_COOKIE_SIZE, "little", signed=True)
+        for count in factories:
+            record += count.to_bytes(_FACTORY_SIZE, "little")
+    except OverflowError as error:
+        raise SnapshotError("The player is too big for the snapshot!") from error
+    record += mask.to_bytes(_effects_size(len(EFFECTS)), "little")
+    return bytes(record), buffs
+
+
+class Snapshot:
+    """A snapshot file mapped into memory, a player is only decoded when it is accessed"""
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as file:
+            try:
+                self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as error:
+                raise SnapshotError("The snapshot is empty!") from error
+
+        try:
+            self._read_header()
+        except SnapshotError:
+            self._map.close()
+            raise
+
+    def _read_header(self) -> None:
+        """Read the header and check that the file holds every record it lists
+
+        Raises:
+            SnapshotError: An error occurred if the file is not a whole snapshot
+        """
+
+        try:
+            magic, version, *counts = _HEADER.unpack_from(self._map)
+        except struct.error as error:
+            raise SnapshotError("This is not a snapshot!") from error
+        if magic != MAGIC or version not in _READABLE:
+            raise SnapshotError("This is not a snapshot of this version!")
+
+        offset = _HEADER.size
+        names = []
+        try:
+            for count in counts:
+                names.append([])
+                for _ in range(count):
+                    length = self._map[offset]
+                    name = self._map[offset + 1 : offset + 1 + length]
+                    if len(name) < length:
+                        raise IndexError(offset)
+                    names[-1].append(name.decode())
+                    offset += 1 + length
+            offset += -(offset + _COUNT.size) % 8
+
+            (self._count,) = _COUNT.unpack_from(self._map, offset)
+        except (IndexError, struct.error, UnicodeDecodeError) as error:
+            raise SnapshotError("The header of the snapshot is broken!") from error
+        self._start = offset + _COUNT.size
+
+        # Where the saved ordinals are in the current catalog
+        try:
+            self._factories = [Factory(name).ordinal for name in names[0]]
+            self._cookies = [Cookie(name).ordinal for name in names[1]]
+            effects = {effect.__name__: i for i, effect in enumerate(EFFECTS)}
+            self._effects = [effects[name] for name in names[2]]
+        except (ValueError, KeyError) as error:
+            raise SnapshotError(f"Unknown item in the snapshot: {error}") from error
+
+        self._cookies_end = _COOKIE_SIZE * len(self._cookies)
+        self._effects_start = self._cookies_end + _FACTORY_SIZE * len(self._factories)
+        self._size = self._effects_start + _effects_size(len(self._effects))
+
+        self._buffs_start = self._start + self._count * self._size
+        self._buff_count = 0
+        if version >= 2:
+            try:
+                (self._buff_count,) = _COUNT.unpack_from(self._map, self._buffs_start)
+            except struct.error as error:
+                raise SnapshotError("The snapshot is truncated!") from error
+            self._buffs_start += _COUNT.size
+
+        expected = self._buffs_start + self._buff_count * _BUFF.size
+        if len(self._map) != expected:
+            raise SnapshotError(
+                f"The snapshot should be {expected} bytes, but it is {len(self._map)}!"
+            )
+
+    def _buffs(self, index: int) -> Iterator[tuple[int, int]]:
+        """Yields the position of the effect and the seconds left of the player's buffs"""
+
+        # The first buff of the player, found by bisection on the sorted indices
+        low, high = 0, self._buff_count
+        while low < high:
+            middle = (low + high) // 2
+            offset = self._buffs_start + middle * _BUFF.size
+            if _BUFF.unpack_from(self._map, offset)[0] < index:
+                low = middle + 1
+            else:
+                high = middle
+
+        for position in range(low, self._buff_count):
+            owner, effect, remaining = _BUFF.unpack_from(
+                self._map, self._buffs_start + position * _BUFF.size
+            )
+            if owner != index:
+                return
+            yield effect, remaining
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index: int) -> Player:
+        return self.player(index)
+
+    def __iter__(self) -> Iterator[Player]:
+        return (self.player(index) for index in range(self._count))
+
+    def __enter__(self) -> "Snapshot":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def player(self, index: int, clock: Callable[[], float] | None = None) -> Player:
+        """Decode the player saved at the index
+
+        Args:
+            index: The position of the player in the snapshot
+            clock: The clock of the player, see Player
+
+        Returns:
+            A new player with the saved cookies, factories, effects and buffs
+        """
+
+        if not 0 <= index < self._count:
+            raise IndexError("There is no such player in the snapshot!")
+
+        start = self._start + index * self._size
+        record = self._map[start : start + self._size]
+
+        player = Player(clock)
+        for position, ordinal in enumerate(self._cookies):
+            field = record[position * _COOKIE_SIZE : (position + 1) * _COOKIE_SIZE]
+            player.cookies.counts[ordinal] = int.from_bytes(
+                field, "little", signed=True
+            )
+        for position, ordinal in enumerate(self._factories):
+            begin = self._cookies_end + position * _FACTORY_SIZE
+            field = record[begin : begin + _FACTORY_SIZE]
+            player.factories.counts[ordinal] = int.from_bytes(field, "little")
+
+        mask = int.from_bytes(record[self._effects_start :], "little")
+        buffs = dict(self._buffs(index))
+        for position, ordinal in enumerate(self._effects):
+            if mask >> position & 1 and position not in buffs:
+                player.effects.add(EFFECTS[ordinal])
+        for position, remaining in buffs.items():
+            player.add_buff(EFFECTS[self._effects[position]], remaining)
+
+        player.refresh()
+        return player
+
+    def close(self) -> None:
+        self._map.close()
@@ -0,0 +1,71 @@
+# MIT License
+#
+# Copyright (c) 2023 Kovács József Miklós
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import unittest
+
+from factory import Factory
+from player import Player
+from script import SimulatedClock
+from achievements import track
+
+
+class SettleTest(unittest.TestCase):
+    """A reward earned while settling counts exactly as if every second was ticked"""
+
+    SECONDS = 5000
+
+    @staticmethod
+    def tracked(clock: SimulatedClock | None = None) -> Player:
+        # The first dark chocolate cookie of the mine earns the darkness reward
+        player = Player(clock)
+        player.factories[Factory.MINE] = 1
+        player.refresh()
+        track(player)
+        return player
+
+    def test_settle_matches_ticks(self) -> None:
+        ticked = self.tracked()
+        for _ in range(self.SECONDS):
+            ticked.tick()
+
+        clock = SimulatedClock()
+        settled = self.tracked(clock)
+        clock.advance(self.SECONDS)
+        settled.settle()
+
+        self.assertEqual(settled.cookies.counts, ticked.cookies.counts)
+        self.assertEqual(settled.effects, ticked.effects)
+        self.assertEqual(settled.last_settled_at, clock())
+
+    def test_advance_matches_ticks(self) -> None:
+        ticked = self.tracked()
+        for _ in range(self.SECONDS):
+            ticked.tick()
+
+        advanced = self.tracked()
+        advanced.advance(self.SECONDS)
+
+        self.assertEqual(advanced.cookies.counts, ticked.cookies.counts)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+# MIT License
+#
+# Copyright (c) 2023 Kovács József Miklós
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import math
+
+from typing import Generic, Hashable, Iterator, TypeVar
+
+T = TypeVar("T", bound=Hashable)
+
+
+class TimingWheel(Generic[T]):
+    """Deadlines of items on a hierarchical timing wheel, in whole ticks
+
+    Level l has 64 slots of 64**l ticks. An item sits on the lowest level
+    whose current rotation contains its deadline, and moves down a level
+    whenever the time reaches its slot, so it is touched at most once per
+    level and expiring costs amortized O(1) per item. Empty stretches of time
+    are skipped at once, so advancing by a long time costs no more than
+    advancing by one tick. Deadlines beyond the top level wait on an
+    overflow list. Only the slots in use are stored.
+    """
+
+    BITS = 6
+    LEVELS = 4
+
+    def __init__(self, now: int = 0) -> None:
+        self.now = now
+        self._deadlines: dict[T, int] = {}
+        self._slots: list[dict[int, list[tuple[int, T]]]] = [
+            {} for _ in range(self.LEVELS)
+        ]
+        self._overflow: list[tuple[int, T]] = []
+        # The time of the next expiry or cascade
+        self._next = math.inf
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def __contains__(self, item: object) -> bool:
+        return item in self._deadlines
+
+    def __iter__(self) -> Iterator[T]:
+        return iter(self._deadlines)
+
+    def deadline(self, item: T) -> int:
+        """Returns the deadline of the item
+
+        Raises:
+            KeyError: An error occurred if the item is not on the wheel
+        """
+
+        return self._deadlines[item]
+
+    def _place(self, deadline: int, item: T) -> None:
+        for level in range(self.LEVELS):
+            shift = self.BITS * (level + 1)
+            if deadline >> shift == self.now >> shift:
+                slot = (deadline >> (self.BITS * level)) & ((1 << self.BITS) - 1)
+                self._slots[level].setdefault(slot, []).append((deadline, item))
+                return
+        self._overflow.append((deadline, item))
+
+    def _next_event(self) -> float:
+        """Returns when the earliest occupied slot is reached"""
+
+        for level, slots in enumerate(self._slots):
+            if slots:
+                shift = self.BITS * level
+                rotation = (self.now >> (shift + self.BITS)) << (shift + self.BITS)
+                return rotation + (min(slots) << shift)
+        if self._overflow:
+            top = self.BITS * self.LEVELS
+            return ((self.now >> top) + 1) << top
+        return math.inf
+
+    def schedule(self, item: T, deadline: int) -> None:
+        """Put the item on the wheel, replacing its previous deadline
+
+        A deadline that has passed is due at the next advance.
+        """
+
+        deadline = max(deadline, self.now)
+        self._deadlines[item] = deadline
+        self._place(deadline, item)
+        self._next = min(self._next, self._next_event())
+
+    def cancel(self, item: T) -> None:
+        """Take the item off the wheel, if it is on it"""
+
+        # The entry in its slot is dropped when the slot is reached
+        self._deadlines.pop(item, None)
+
+    def advance(self, now: int) -> list[tuple[int, T]]:
+        """Move the time forward
+
+        Returns:
+            The deadline and the item of every expired item, in the order of the deadlines
+        """
+
+        expired: list[tuple[int, T]] = []
+        while self._next <= now:
+            self.now = int(self._next)
+
+            top = self.BITS * self.LEVELS
+            if self.now & ((1 << top) - 1) == 0:
+                overflow, self._overflow = self._overflow, []
+                for deadline, item in overflow:
+                    if self._deadlines.get(item) == deadline:
+                        self._place(deadline, item)
+
+            # Cascade the slots that begin now, from the top level down
+            for level in range(self.LEVELS - 1, 0, -1):
+                shift = self.BITS * level
+                if self.now & ((1 << shift) - 1) == 0:
+                    slot = (self.now >> shift) & ((1 << self.BITS) - 1)
+                    for deadline, item in self._slots[level].pop(slot, ()):
+                        if self._deadlines.get(item) == deadline:
+                            self._place(deadline, item)
+
+            for deadline, item in self._slots[0].pop(
+                self.now & ((1 << self.BITS) - 1), ()
+            ):
+                if self._deadlines.get(item) == deadline:
+                    del self._deadlines[item]
+                    expired.append((deadline, item))
+
+            self._next = self._next_event()
+
+        self.now = max(self.now, now)
+        return expired